@@ -7,36 +7,66 @@ import os
 import sys
 from dotenv import load_dotenv
 
-# Load environment
-load_dotenv()
+# Known key prefixes and what they indicate
+_KEY_KIND = {'sbp_': 'PAT', 'eyJ': 'JWT'}
 
-print("=" * 60)
-print("Supabase Configuration Diagnostic")
-print("=" * 60)
+# Parsed environment, loaded once on first use
+_ENV = {}
 
-# Get credentials
-url = os.environ.get('SUPABASE_URL', '')
-key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
 
-print(f"URL: {url}")
-print(f"Key format: {key[:10]}... (length: {len(key)})")
-print()
+def _get_env() -> dict:
+    """Load .env once and cache the Supabase settings"""
+    if not _ENV:
+        load_dotenv()
+        _ENV['url'] = os.environ.get('SUPABASE_URL', '')
+        _ENV['key'] = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
+    return _ENV
 
-if key.startswith('sbp_'):
-    print("⚠️  Key starts with 'sbp_' - this appears to be a Personal Access Token")
-    print("   You need the JWT service role key instead.")
+
+def diagnose() -> dict:
+    """Return the configured URL and the detected service role key format"""
+    env = _get_env()
+    key = env['key']
+    key_kind = next((kind for prefix, kind in _KEY_KIND.items() if key.startswith(prefix)), 'UNKNOWN')
+    return {
+        'url': env['url'],
+        'key_prefix': key[:10],
+        'key_length': len(key),
+        'key_kind': key_kind
+    }
+
+
+def main():
+    """Print a human-readable diagnostic report"""
+    result = diagnose()
+
+    print("=" * 60)
+    print("Supabase Configuration Diagnostic")
+    print("=" * 60)
+
+    print(f"URL: {result['url']}")
+    print(f"Key format: {result['key_prefix']}... (length: {result['key_length']})")
     print()
-    print("To get the correct key:")
-    print("1. Go to your Supabase dashboard")
-    print("2. Navigate to Settings → API")
-    print("3. Copy the 'service_role' key (JWT format, starts with 'eyJ')")
-    print("4. Update SUPABASE_SERVICE_ROLE_KEY in .env")
-elif key.startswith('eyJ'):
-    print("✅ Key appears to be in JWT format (correct)")
-else:
-    print("❌ Unknown key format")
-
-print()
-print("Note: The service role key should be a long JWT token that starts with 'eyJ'")
-print("      It's different from personal access tokens (sbp_) or anon keys.")
-print("=" * 60)
\ No newline at end of file
+
+    if result['key_kind'] == 'PAT':
+        print("⚠️  Key starts with 'sbp_' - this appears to be a Personal Access Token")
+        print("   You need the JWT service role key instead.")
+        print()
+        print("To get the correct key:")
+        print("1. Go to your Supabase dashboard")
+        print("2. Navigate to Settings → API")
+        print("3. Copy the 'service_role' key (JWT format, starts with 'eyJ')")
+        print("4. Update SUPABASE_SERVICE_ROLE_KEY in .env")
+    elif result['key_kind'] == 'JWT':
+        print("✅ Key appears to be in JWT format (correct)")
+    else:
+        print("❌ Unknown key format")
+
+    print()
+    print("Note: The service role key should be a long JWT token that starts with 'eyJ'")
+    print("      It's different from personal access tokens (sbp_) or anon keys.")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,39 @@
 # Gunicorn configuration for Printer API Service v2
+
+# gevent must patch the stdlib before preload_app imports the service module,
+# otherwise locks/queues created at import time are real OS primitives
+from gevent import monkey
+monkey.patch_all()
+
+import os
+
 bind = "0.0.0.0:5000"
-workers = 2  # 2 workers for redundancy, but keep low for resource efficiency
-threads = 2  # 2 threads per worker = 4 total threads max
+workers = 1  # Single worker owns the TCP listener, receipt cache and dashboard sockets
+worker_connections = 1000  # Idle WebSockets cost a greenlet, not an OS thread
 timeout = 30  # 30 second timeout for requests
+graceful_timeout = 30  # Let open WebSockets drain before a worker is replaced
 keepalive = 5  # 5 second keepalive
-max_requests = 1000  # Restart workers after 1000 requests to prevent memory leaks
-max_requests_jitter = 50  # Randomize restart between 950-1050 requests
+max_requests = 10000  # Recycle worker to contain leaks; rare since each recycle re-warms imports
+max_requests_jitter = 500  # Randomize restart between 9500-10500 requests
+worker_tmp_dir = "/dev/shm"  # Heartbeat file on tmpfs instead of disk
 preload_app = True  # Load app before forking workers
-worker_class = "gthread"  # Use gthread workers for thread support
+worker_class = "gevent"  # Event loop worker for long-lived WebSocket connections
+# With monkey-patching every service "thread" is a greenlet on this one hub, so work
+# that can't yield (ESC/POS parsing, sqlite) is sent to the hub's native threadpool -
+# see run_blocking() in printer_api_service_v2.py
 
 # Limit request line size to prevent DoS
 limit_request_line = 4094
 limit_request_fields = 100
 limit_request_field_size = 8190
 
-# Access log format
-accesslog = "-"  # Log to stdout
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
+# Access log - off by default: per-request formatting and the synchronized
+# stdout write sit on the request path, and the Cloudflare tunnel already
+# records every request. Set GUNICORN_ACCESS_LOG=- (or a file path) to debug.
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+access_log_format = '%(h)s %(t)s "%(r)s" %(s)s %(b)s %(D)s'
 errorlog = "-"  # Log errors to stderr
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'warning')  # Only warnings and above by default
 
 # Worker process naming
 proc_name = "printer-api-v2"
@@ -34,20 +50,26 @@ tmp_upload_dir = None
 # keyfile = None
 # certfile = None
 
-# Hook to start services only in master process
-def when_ready(server):
-    """Called just after the server is started."""
+# Hook to start services in the worker process
+# With preload_app the service module is imported in the master, but threads
+# started there don't survive the fork - so start them after forking instead.
+def post_fork(server, worker):
+    """Called just after a worker has been forked."""
     # Import here to avoid circular dependency
     from printer_api_service_v2 import service
-    import time
     
-    server.log.info("Starting Printer API Service v2 components in master...")
-    print("Starting Printer API Service v2 components...")
+    server.log.info(f"Starting Printer API Service v2 components in worker {worker.pid}...")
     
     # Start all services (TCP server, Cloudflare queue, cleanup)
     service.start()
     
-    # Give services time to start
-    time.sleep(2)
-    print("All services started successfully")
-    server.log.info("All services started successfully")
\ No newline at end of file
+    server.log.info("All services started successfully")
+
+# Dish rows still in the insert buffer and queued Axiom events are only flushed by
+# service.stop() - run it on every worker exit (SIGTERM, max_requests recycle)
+def worker_exit(server, worker):
+    """Called just after a worker has exited, in the worker process."""
+    from printer_api_service_v2 import service
+    
+    server.log.info(f"Stopping Printer API Service v2 components in worker {worker.pid}...")
+    service.stop()
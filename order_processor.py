@@ -7,24 +7,202 @@ import os
 import re
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass
 import httpx
 from supabase import create_client, Client
 import asyncio
-from threading import Thread
+from threading import Thread, Lock, Condition
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import heapq
+import itertools
 import queue
 import time
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class Dish:
-    """Represents a dish from receipt"""
-    name: str
-    quantity: int
-    station_id: Optional[str] = None
+# Receipt parsing patterns, compiled once
+_RE_TABLE = re.compile(r'桌号[:：]\s*([^\n]+)')
+_RE_STATION = re.compile(r'档口[:：]\s*([^\n]+)')
+_RE_DISH_SECTION_CUSTOMER = re.compile(r'菜品[单价]*数量[小计]*\n([\s\S]*?)(?:菜品价格合计|\n\n|$)')
+# Name must end on a non-digit so its trailing digits can't be taken for the price
+_RE_CUSTOMER_DISH = re.compile(
+    r'^(?P<name>.*?\D)(?P<price>\d+)(?P<qty>\d)(?P<unit>[份瓶听盒位杯碗个张])(?P<subtotal>\d+)$'
+)
+_RE_DISH_SIMPLE_FALLBACK = re.compile(r'^(?P<name>\D.*?)(?:\d+[份瓶听盒位杯碗个张]\d+|\d+)$')
+_RE_DISH_SECTION_KITCHEN = re.compile(r'菜品数量\n([\s\S]*?)(\n单号:|$)')
+_RE_QTY_UNIT = re.compile(r'(\d+)\/[份瓶听盒个碗杯位]')
+# One match per dish line: name before the first quantity/unit, modifier lines (-) skipped
+_RE_KITCHEN_DISH = re.compile(r'(?m)^(?![^\S\n]*-)([^\n]*?)(\d+)\/[份瓶听盒个碗杯位]')
+_RETURN_PREFIX = '(退)'
+
+# Direct Postgres through Supabase's pooled (Supavisor) endpoint (optional -
+# dish inserts go through PostgREST without it)
+try:
+    from psycopg_pool import ConnectionPool
+    PG_POOL_ENABLED = True
+except ImportError:
+    PG_POOL_ENABLED = False
+
+# Fast JSON encoding for Axiom and dish batches (optional - stdlib json is the fallback)
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
+
+def _dumps(obj) -> bytes:
+    """Encode obj as UTF-8 JSON bytes"""
+    if ORJSON_ENABLED:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+# Formatted UTC timestamp, rebuilt at most once per second: (iso_string, epoch_second)
+_ts_cache = ('', 0)
+
+
+def _now_iso() -> str:
+    """Current UTC time as ISO 8601 at second resolution, cached per second"""
+    global _ts_cache
+    now = int(time.time())
+    cached = _ts_cache
+    if cached[1] != now:
+        cached = _ts_cache = (datetime.fromtimestamp(now, tz=timezone.utc).isoformat(), now)
+    return cached[0]
+
+
+# HTTP/2 for the Axiom client (optional - needs the h2 package)
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# Dish insert batching - rows from concurrent receipts share one PostgREST call
+DISH_BATCH_INTERVAL = 0.05  # Max seconds to wait for more rows before flushing
+DISH_BATCH_MAX = 200  # Max rows per insert call - reaching it flushes right away
+DISH_BUFFER_LIMIT = 10000  # Rows kept while Supabase is unreachable
+DISH_FLUSH_BACKOFF = 5  # Seconds to wait after a failed flush
+
+# Receipts processed concurrently off the caller's thread
+ORDER_WORKERS = 4
+
+# Connection pool for the Supabase (PostgREST) HTTP client
+SUPABASE_HTTP_LIMITS = dict(max_keepalive_connections=20, max_connections=50, keepalive_expiry=90)
+
+# Pool for the direct Postgres connection (SUPABASE_DB_URL)
+PG_POOL_MIN_SIZE = 1
+PG_POOL_MAX_SIZE = 4
+PG_POOL_MAX_IDLE = 1800  # Seconds before an idle connection is closed
+
+# Column order for direct order_dishes inserts - rows are streamed with COPY
+DISH_COLUMNS = ('order_id', 'restaurant_id', 'receipt_no', 'name', 'quantity',
+                'station_id', 'table_no', 'status', 'prep_time_minutes', 'urgency_level')
+_DISH_COPY_SQL = f"COPY order_dishes ({', '.join(DISH_COLUMNS)}) FROM STDIN"
+
+# Failed receipts held for retry; new failures are dropped beyond this
+RETRY_QUEUE_SIZE = 1000
+RETRY_INITIAL_DELAY = 5  # Seconds before the first retry, doubled after each failure
+RETRY_MAX_DELAY = 300  # A receipt that fails at this delay is discarded
+
+# Axiom events are queued and shipped in batches off the receipt path
+AXIOM_QUEUE_SIZE = 10000  # Events held while Axiom is slow; newer events dropped beyond this
+AXIOM_BATCH_MAX = 100  # Max events per ingest call
+
+
+@lru_cache(maxsize=512)
+def _parse_customer_dishes(text: str) -> Tuple[Tuple[str, int], ...]:
+    """Parse (name, quantity) pairs from customer order text (客单 format); cached so retries skip the regex work"""
+    dishes = []
+    # Start the regex at the header so it doesn't walk the receipt preamble
+    start = text.find('菜品') if text else -1
+    if start < 0:
+        return ()
+    
+    # Look for dishes section between markers
+    dish_section_match = _RE_DISH_SECTION_CUSTOMER.search(text, start)
+    if not dish_section_match:
+        return ()
+    
+    dish_section = dish_section_match.group(1)
+    lines = dish_section.split('\n')
+    
+    for line in lines:
+        trimmed = line.strip()
+        if not trimmed:
+            continue
+        
+        # Skip modifiers (start with -)
+        if trimmed.startswith('-'):
+            continue
+        
+        # Real format from API: "野菜卷181份18" or "紫苏半边云（鲜牛胸口）381份38"
+        # Pattern: dish_name + price + quantity + unit + subtotal
+        # Use non-greedy match and look for the last occurrence of digit+unit pattern
+        match = _RE_CUSTOMER_DISH.match(trimmed)
+        if match:
+            name = match.group('name').strip()
+            quantity = int(match.group('qty'))  # The digit before unit is quantity
+            
+            if name and quantity > 0:
+                dishes.append((name, quantity))
+                logger.debug(f"Parsed customer dish: {name} x{quantity}")
+        else:
+            # Fallback for simpler format
+            simple_match = _RE_DISH_SIMPLE_FALLBACK.match(trimmed)
+            if simple_match:
+                # Pattern already rejects names starting with a digit
+                name = simple_match.group('name').strip()
+                dishes.append((name, 1))
+                logger.debug(f"Parsed customer dish (fallback): {name} x1")
+    
+    return tuple(dishes)
+
+
+@lru_cache(maxsize=512)
+def _parse_kitchen_slip_dishes(text: str) -> Tuple[Tuple[str, int], ...]:
+    """Parse (name, quantity) pairs from kitchen slip text (制作分单 format); cached like the customer parser"""
+    dishes = []
+    start = text.find('菜品数量') if text else -1
+    if start < 0:
+        return ()
+    
+    # Look for dishes section after "菜品数量"
+    dish_section_match = _RE_DISH_SECTION_KITCHEN.search(text, start)
+    if not dish_section_match:
+        return ()
+    
+    dish_section = dish_section_match.group(1)
+    
+    for match in _RE_KITCHEN_DISH.finditer(dish_section):
+        dish_line = match.group(1).strip()
+        
+        # Check if dish name has unclosed parenthesis (multi-line dish)
+        if '（' in dish_line and '）' not in dish_line:
+            # Look for continuation on next line
+            line_end = dish_section.find('\n', match.end())
+            if line_end != -1:
+                next_end = dish_section.find('\n', line_end + 1)
+                next_line = dish_section[line_end + 1:next_end if next_end != -1 else None].strip()
+                if '）' in next_line and not _RE_QTY_UNIT.search(next_line):
+                    # Combine the lines
+                    dish_line = dish_line + next_line
+        
+        # Remove any (退) prefix for returned dishes (a literal - no regex needed)
+        if dish_line.startswith(_RETURN_PREFIX):
+            dish_line = dish_line[len(_RETURN_PREFIX):].strip()
+        
+        if dish_line and len(dish_line) > 1:
+            quantity = int(match.group(2))
+            dishes.append((dish_line, quantity))
+            logger.debug(f"Parsed kitchen dish: {dish_line} x{quantity}")
+    
+    return tuple(dishes)
+
 
 class OrderProcessor:
     """Process orders locally and send directly to Supabase"""
@@ -32,6 +210,16 @@ class OrderProcessor:
     # Fixed IDs from Worker
     RESTAURANT_ID = 'a1b2c3d4-e5f6-7890-abcd-ef1234567890'
     
+    # Fields every order_dishes row starts with. Rows from different receipts share
+    # one bulk insert, so they all carry the same keys (PostgREST takes the column
+    # list from the first row)
+    DISH_ROW_DEFAULTS = {
+        'order_id': None,
+        'status': 'pending',
+        'prep_time_minutes': 10,
+        'urgency_level': 'normal'
+    }
+    
     # Station mapping from Worker
     STATION_MAP = {
         '荤菜': 'b2c3d4e5-f6a7-8901-bcde-f23456789012',
@@ -45,15 +233,18 @@ class OrderProcessor:
     }
     
     def __init__(self, supabase_url: str = None, supabase_key: str = None, 
-                 axiom_token: str = None, axiom_dataset: str = 'kitchen-orders'):
+                 axiom_token: str = None, axiom_dataset: str = 'kitchen-orders',
+                 db_url: str = None):
         """Initialize with Supabase and Axiom credentials"""
         # Get from env if not provided
         self.supabase_url = supabase_url or os.environ.get('SUPABASE_URL')
         self.supabase_key = supabase_key or os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+        self.db_url = db_url or os.environ.get('SUPABASE_DB_URL')
         self.axiom_token = axiom_token or os.environ.get('AXIOM_TOKEN')
         self.axiom_dataset = axiom_dataset
         
-        # Initialize Supabase client
+        # Initialize Supabase client (no sockets are opened until the first request;
+        # start() swaps in the pooled HTTP session)
         if self.supabase_url and self.supabase_key:
             self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
             logger.info(f"Supabase client initialized for {self.supabase_url}")
@@ -61,68 +252,314 @@ class OrderProcessor:
             self.supabase = None
             logger.warning("Supabase credentials not configured")
         
-        # Retry queue for failed operations
-        self.retry_queue = queue.Queue()
+        # Pooled Postgres connection for bulk dish inserts (opened on first flush,
+        # so its threads start in the process that uses it)
+        self.pg_pool = None
+        self._pg_pool_lock = Lock()
+        self._pg_pool_opened = False
+        if self.supabase and self.db_url:
+            if PG_POOL_ENABLED:
+                self.pg_pool = ConnectionPool(
+                    self.db_url,
+                    min_size=PG_POOL_MIN_SIZE,
+                    max_size=PG_POOL_MAX_SIZE,
+                    max_idle=PG_POOL_MAX_IDLE,
+                    check=ConnectionPool.check_connection,  # Validate before handing out
+                    kwargs={'prepare_threshold': None},  # Supavisor transaction mode has no prepared statements
+                    open=False
+                )
+                logger.info("Dish inserts will use the pooled Postgres endpoint")
+            else:
+                logger.warning("SUPABASE_DB_URL set but psycopg_pool is not installed, using PostgREST")
+        
+        # Pooled Axiom client, created by start() - keeps the TLS connection alive between events
+        self.axiom_url = f'https://api.axiom.co/v1/datasets/{self.axiom_dataset}/ingest'
+        self._http = None
+        self._axiom_queue = queue.Queue(maxsize=AXIOM_QUEUE_SIZE)
+        self.axiom_thread = None
+        
+        # Order + dishes go through one RPC until we learn it isn't deployed
+        self._order_rpc_available = True
+        
+        # Worker pool so callers don't wait on Supabase round trips
+        self.executor = ThreadPoolExecutor(max_workers=ORDER_WORKERS, thread_name_prefix='order')
+        
+        # Retry schedule for failed operations: heap of (next_attempt, seq, delay, receipt)
+        self.retry_queue = []
+        self._retry_cv = Condition()
+        self._retry_seq = itertools.count()
         self.retry_thread = None
         self.running = True
+        self._stop_lock = Lock()
+        self._stopped = False
+        
+        # Buffered order_dishes rows (one list per receipt), flushed in bulk by a background thread
+        self._dish_buffer = deque()
+        self._buffered_rows = 0
+        self._buffer_lock = Lock()
+        self._buffer_cv = Condition(self._buffer_lock)  # Signalled by queue_dishes() and stop()
+        self.flush_thread = None
+    
+    def start(self):
+        """Open the pooled HTTP clients and start the background workers
+
+        Nothing here runs in __init__, so a processor built in gunicorn's master
+        (preload_app) holds no threads or sockets until the worker calls start().
+        """
+        if self.supabase:
+            self._configure_supabase_http()
+        if self.axiom_token:
+            self._http = httpx.Client(
+                http2=HTTP2_ENABLED,
+                timeout=5,
+                headers={
+                    'Authorization': f'Bearer {self.axiom_token}',
+                    'Content-Type': 'application/json'
+                },
+                # Only the Axiom worker (and stop()'s final drain) posts, so two sockets is plenty
+                limits=httpx.Limits(max_keepalive_connections=2, max_connections=2, keepalive_expiry=60)
+            )
         self.start_retry_worker()
+        self.start_flush_worker()
+        if self._http:
+            self.start_axiom_worker()
+    
+    def _configure_supabase_http(self):
+        """Swap PostgREST's default httpx session for a pooled (HTTP/2 if available) one"""
+        try:
+            postgrest = self.supabase.postgrest
+            session = postgrest.session
+            postgrest.session = httpx.Client(
+                base_url=session.base_url,
+                headers=session.headers,
+                timeout=session.timeout,
+                http2=HTTP2_ENABLED,
+                limits=httpx.Limits(**SUPABASE_HTTP_LIMITS)
+            )
+            session.close()
+            logger.info(f"Supabase HTTP pool: http2={HTTP2_ENABLED}, {SUPABASE_HTTP_LIMITS}")
+        except AttributeError as e:
+            # supabase-py internals differ between versions - keep its default client
+            logger.warning(f"Could not configure Supabase HTTP pool: {e}")
     
     def start_retry_worker(self):
         """Start background thread for retry processing"""
         def retry_worker():
-            retry_delays = {}  # Track retry delays per receipt
-            
             while self.running:
-                try:
-                    if not self.retry_queue.empty():
-                        receipt_data = self.retry_queue.get(timeout=1)
-                        receipt_no = receipt_data.get('receipt_no', 'unknown')
-                        
-                        # Exponential backoff
-                        if receipt_no in retry_delays:
-                            retry_delays[receipt_no] = min(retry_delays[receipt_no] * 2, 300)
-                        else:
-                            retry_delays[receipt_no] = 5
-                        
-                        time.sleep(retry_delays[receipt_no])
-                        
-                        try:
-                            result = self.process_receipt(receipt_data)
-                            logger.info(f"Retry successful for receipt {receipt_no}: {result}")
-                            # Remove from retry delays on success
-                            retry_delays.pop(receipt_no, None)
-                        except Exception as e:
-                            logger.error(f"Retry failed for {receipt_no}: {e}")
-                            # Re-queue if not too many retries
-                            if retry_delays[receipt_no] < 300:
-                                self.retry_queue.put(receipt_data)
-                            else:
-                                logger.error(f"Max retries reached for {receipt_no}, discarding")
-                                retry_delays.pop(receipt_no, None)
-                except queue.Empty:
-                    pass
-                except Exception as e:
-                    logger.error(f"Retry worker error: {e}")
+                with self._retry_cv:
+                    if not self.retry_queue:
+                        # Idle until queue_retry() or stop() notifies - no polling
+                        self._retry_cv.wait()
+                        continue
+                    # Sleep until the earliest retry is due (or a sooner one arrives)
+                    wait = self.retry_queue[0][0] - time.monotonic()
+                    if wait > 0:
+                        self._retry_cv.wait(timeout=wait)
+                        continue
+                    _, _, delay, receipt_data = heapq.heappop(self.retry_queue)
                 
-                time.sleep(5)  # Check every 5 seconds
+                # Run on the worker pool so a slow retry doesn't hold up the others
+                self.executor.submit(self._attempt_retry, receipt_data, delay)
         
         self.retry_thread = Thread(target=retry_worker, daemon=True)
         self.retry_thread.start()
         logger.info("Retry worker thread started")
     
+    def _attempt_retry(self, receipt_data: Dict, delay: float):
+        """Retry one receipt, rescheduling it with a doubled delay on failure"""
+        receipt_no = receipt_data.get('receipt_no', 'unknown')
+        try:
+            result = self.process_receipt(receipt_data, retry=False)
+            logger.info(f"Retry successful for receipt {receipt_no}: {result}")
+        except Exception as e:
+            logger.error(f"Retry failed for {receipt_no}: {e}")
+            # Exponential backoff until the max delay is reached
+            if delay < RETRY_MAX_DELAY:
+                self.queue_retry(receipt_data, min(delay * 2, RETRY_MAX_DELAY))
+            else:
+                logger.error(f"Max retries reached for {receipt_no}, discarding")
+    
+    def queue_retry(self, receipt_data: Dict, delay: float = RETRY_INITIAL_DELAY):
+        """Schedule a failed receipt for retry after delay seconds"""
+        with self._retry_cv:
+            if len(self.retry_queue) >= RETRY_QUEUE_SIZE:
+                logger.error(f"Retry queue full, dropping receipt {receipt_data.get('receipt_no')}")
+                return
+            heapq.heappush(self.retry_queue, (time.monotonic() + delay, next(self._retry_seq), delay, receipt_data))
+            self._retry_cv.notify()
+    
+    def start_flush_worker(self):
+        """Start background thread that bulk-inserts buffered dish rows"""
+        def flush_worker():
+            while self.running:
+                with self._buffer_cv:
+                    # Idle until queue_dishes() or stop() notifies - no wakeups while empty
+                    while self.running and not self._dish_buffer:
+                        self._buffer_cv.wait()
+                    # Let rows from concurrent receipts accumulate, unless a full batch is already waiting
+                    self._buffer_cv.wait_for(
+                        lambda: self._buffered_rows >= DISH_BATCH_MAX or not self.running,
+                        timeout=DISH_BATCH_INTERVAL
+                    )
+                if not self.flush_dishes():
+                    time.sleep(DISH_FLUSH_BACKOFF)
+        
+        self.flush_thread = Thread(target=flush_worker, daemon=True)
+        self.flush_thread.start()
+        logger.info("Dish flush worker thread started")
+    
+    def start_axiom_worker(self):
+        """Start background thread that ships queued Axiom events in batches"""
+        def axiom_worker():
+            while self.running:
+                try:
+                    batch = [self._axiom_queue.get(timeout=1)]
+                except queue.Empty:
+                    continue
+                # Ship everything that piled up in one ingest call
+                time.sleep(0.1)
+                batch.extend(self._drain_axiom_queue(AXIOM_BATCH_MAX - 1))
+                self._send_axiom_batch(batch)
+        
+        self.axiom_thread = Thread(target=axiom_worker, daemon=True)
+        self.axiom_thread.start()
+        logger.info("Axiom worker thread started")
+    
+    def _drain_axiom_queue(self, limit: int) -> List[Dict]:
+        """Take up to limit queued Axiom events without blocking"""
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._axiom_queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+    
+    def _send_axiom_batch(self, batch: List[Dict]):
+        """POST a batch of events to Axiom's ingest endpoint"""
+        try:
+            # Content-Type is set on the client; send pre-encoded bytes
+            response = self._http.post(self.axiom_url, content=_dumps(batch))
+            if response.status_code != 200:
+                logger.warning(f"Axiom logging returned {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Axiom logging failed: {e}")
+    
+    def queue_dishes(self, rows: List[Dict]):
+        """Buffer one receipt's order_dishes rows for the next bulk insert"""
+        with self._buffer_cv:
+            while self._dish_buffer and self._buffered_rows + len(rows) > DISH_BUFFER_LIMIT:
+                # Supabase has been down a long time - drop the oldest receipts
+                dropped = self._dish_buffer.popleft()
+                self._buffered_rows -= len(dropped)
+                logger.error(f"Dish buffer full, dropping {len(dropped)} rows of receipt {dropped[0].get('receipt_no')}")
+            self._dish_buffer.append(rows)
+            self._buffered_rows += len(rows)
+            self._buffer_cv.notify()
+    
+    def flush_dishes(self) -> bool:
+        """Insert all buffered dish rows in batches of up to DISH_BATCH_MAX; returns False on failure
+
+        A receipt's rows are never split across batches, so each receipt lands in a
+        single insert and receipts go out in the order they were queued.
+        """
+        while True:
+            with self._buffer_lock:
+                receipts = []
+                count = 0
+                while self._dish_buffer and (not receipts or count + len(self._dish_buffer[0]) <= DISH_BATCH_MAX):
+                    rows = self._dish_buffer.popleft()
+                    receipts.append(rows)
+                    count += len(rows)
+                self._buffered_rows -= count
+            if not receipts:
+                return True
+            
+            batch = [row for rows in receipts for row in rows]
+            try:
+                self._insert_dish_rows(batch)
+                logger.info(f"Inserted {len(batch)} dishes from {len(receipts)} receipts to Supabase")
+            except Exception as e:
+                logger.error(f"Failed to insert {len(batch)} buffered dishes: {e}")
+                # Put the batch back in front so it goes out first on the next flush
+                with self._buffer_lock:
+                    self._dish_buffer.extendleft(reversed(receipts))
+                    self._buffered_rows += count
+                return False
+    
+    def _insert_dish_rows(self, rows: List[Dict]):
+        """Bulk insert order_dishes rows over the pooled Postgres endpoint, or PostgREST without it"""
+        if not self.pg_pool:
+            # Serialize the batch once (orjson when available) and skip postgrest's
+            # request builder; return=minimal keeps the inserted rows out of the response
+            response = self.supabase.postgrest.session.post(
+                '/order_dishes',
+                content=_dumps(rows),
+                headers={'Content-Type': 'application/json', 'Prefer': 'return=minimal'}
+            )
+            response.raise_for_status()
+            return
+        
+        with self._pg_pool_lock:
+            if not self._pg_pool_opened:
+                self.pg_pool.open()
+                self._pg_pool_opened = True
+        # One COPY per batch instead of a parsed INSERT per row
+        with self.pg_pool.connection() as conn:
+            with conn.cursor() as cur:
+                with cur.copy(_DISH_COPY_SQL) as copy:
+                    for row in rows:
+                        copy.write_row([row[c] for c in DISH_COLUMNS])
+    
     def stop(self):
-        """Stop the retry worker"""
+        """Finish in-flight receipts, stop the workers and flush any buffered dishes
+
+        Safe to call more than once (gunicorn's worker_exit hook and a signal
+        handler can both get here) - only the first call does the work.
+        """
+        with self._stop_lock:
+            if self._stopped:
+                return
+            self._stopped = True
         self.running = False
+        with self._retry_cv:
+            self._retry_cv.notify()
         if self.retry_thread:
             self.retry_thread.join(timeout=10)
+        self.executor.shutdown(wait=True)
+        with self._buffer_cv:
+            self._buffer_cv.notify()
+        if self.flush_thread:
+            self.flush_thread.join(timeout=10)
+        if self.supabase:
+            self.flush_dishes()
+            try:
+                self.supabase.postgrest.session.close()
+            except AttributeError:
+                pass
+        if self._pg_pool_opened:
+            self.pg_pool.close()
+        _parse_customer_dishes.cache_clear()
+        _parse_kitchen_slip_dishes.cache_clear()
+        if self._http:
+            if self.axiom_thread:
+                self.axiom_thread.join(timeout=10)
+            # Ship whatever telemetry is still queued before closing the client
+            while True:
+                batch = self._drain_axiom_queue(AXIOM_BATCH_MAX)
+                if not batch:
+                    break
+                self._send_axiom_batch(batch)
+            self._http.close()
     
     def extract_table_number(self, text: str) -> str:
         """Extract table number from receipt text"""
-        if not text:
+        # Plain substring check is far cheaper than running the regex on receipts without a table
+        if not text or '桌号' not in text:
             return '未知'
         
         # Try to match table number pattern
-        table_match = re.search(r'桌号[:：]\s*([^\n]+)', text)
+        table_match = _RE_TABLE.search(text)
         if table_match:
             return table_match.group(1).strip()
         
@@ -137,8 +574,8 @@ class OrderProcessor:
         if order_type == 'kitchenSlip':
             return True
         
-        # Check text markers
-        if '制作分单' in text or '(加菜)制作分单' in text:
+        # Check text markers ('(加菜)制作分单' contains '制作分单', so one scan covers both)
+        if '制作分单' in text:
             return True
         
         return False
@@ -158,130 +595,27 @@ class OrderProcessor:
         
         return False, ""
     
-    def parse_customer_dishes(self, text: str) -> List[Dish]:
-        """Parse dishes from customer order text (客单 format)"""
-        dishes = []
-        if not text:
-            return dishes
-        
-        # Look for dishes section between markers
-        dish_section_match = re.search(
-            r'菜品[单价]*数量[小计]*\n([\s\S]*?)(?:菜品价格合计|\n\n|$)',
-            text
-        )
-        if not dish_section_match:
-            return dishes
-        
-        dish_section = dish_section_match.group(1)
-        lines = dish_section.split('\n')
-        
-        for line in lines:
-            trimmed = line.strip()
-            if not trimmed:
-                continue
-            
-            # Skip modifiers (start with -)
-            if trimmed.startswith('-'):
-                continue
-            
-            # Real format from API: "野菜卷181份18" or "紫苏半边云（鲜牛胸口）381份38"
-            # Pattern: dish_name + price + quantity + unit + subtotal
-            # Use non-greedy match and look for the last occurrence of digit+unit pattern
-            match = re.match(r'^(.+?)(\d+)(\d)([份瓶听盒位杯碗个张])(\d+)$', trimmed)
-            if match:
-                name = match.group(1).strip()
-                # The regex might be too greedy, let's validate the name doesn't end with a digit
-                # If it does, we need to adjust the parsing
-                if name and name[-1].isdigit():
-                    # Try to find the actual dish name by looking for the pattern more carefully
-                    # Find the last occurrence of digit+digit+unit+digit pattern
-                    better_match = re.search(r'^(.*?)(\d{1,3})(\d)([份瓶听盒位杯碗个张])(\d+)$', trimmed)
-                    if better_match:
-                        name = better_match.group(1).strip()
-                        quantity = int(better_match.group(3))
-                else:
-                    quantity = int(match.group(3))  # The digit before unit is quantity
-                
-                if name and quantity > 0:
-                    dishes.append(Dish(name=name, quantity=quantity))
-                    logger.debug(f"Parsed customer dish: {name} x{quantity}")
-            else:
-                # Fallback for simpler format
-                simple_match = re.match(r'^(.+?)(?:\d+[份瓶听盒位杯碗个张]\d+|\d+)$', trimmed)
-                if simple_match:
-                    name = simple_match.group(1).strip()
-                    if name and not name[0].isdigit():
-                        dishes.append(Dish(name=name, quantity=1))
-                        logger.debug(f"Parsed customer dish (fallback): {name} x1")
-        
+    def parse_customer_rows(self, text: str, row: Dict) -> List[Dict]:
+        """Parse dishes from customer order text (客单 format) into order_dishes rows based on row"""
+        dishes = [{**row, 'name': name, 'quantity': quantity} for name, quantity in _parse_customer_dishes(text)]
         logger.info(f"Parsed {len(dishes)} dishes from customer order")
         return dishes
     
-    def parse_kitchen_slip_dishes(self, text: str) -> List[Dish]:
-        """Parse dishes from kitchen slip text (制作分单 format)"""
-        dishes = []
-        if not text:
-            return dishes
-        
-        # Look for dishes section after "菜品数量"
-        dish_section_match = re.search(r'菜品数量\n([\s\S]*?)(\n单号:|$)', text)
-        if not dish_section_match:
-            return dishes
-        
-        dish_section = dish_section_match.group(1)
-        lines = dish_section.split('\n')
-        
-        i = 0
-        while i < len(lines):
-            trimmed = lines[i].strip()
-            if not trimmed:
-                i += 1
-                continue
-            
-            # Skip modifiers
-            if trimmed.startswith('-'):
-                i += 1
-                continue
-            
-            # Check for dishes with quantity/unit pattern
-            if re.search(r'\d+\/[份瓶听盒个碗杯位]', trimmed):
-                # Extract dish name by removing quantity/unit part
-                dish_line = re.sub(r'\d+\/[份瓶听盒个碗杯位].*$', '', trimmed).strip()
-                
-                # Check if dish name has unclosed parenthesis (multi-line dish)
-                if '（' in dish_line and '）' not in dish_line:
-                    # Look for continuation on next line
-                    if i + 1 < len(lines):
-                        next_line = lines[i + 1].strip()
-                        if '）' in next_line and not re.search(r'\d+\/[份瓶听盒个碗杯位]', next_line):
-                            # Combine the lines
-                            dish_line = dish_line + next_line
-                            i += 1  # Skip the next line since we've processed it
-                
-                # Remove any (退) prefix for returned dishes
-                dish_line = re.sub(r'^\(退\)', '', dish_line).strip()
-                
-                if dish_line and len(dish_line) > 1:
-                    # Extract quantity if possible
-                    quantity_match = re.search(r'(\d+)\/[份瓶听盒个碗杯位]', trimmed)
-                    quantity = int(quantity_match.group(1)) if quantity_match else 1
-                    
-                    dishes.append(Dish(name=dish_line, quantity=quantity))
-                    logger.debug(f"Parsed kitchen dish: {dish_line} x{quantity}")
-            
-            i += 1
-        
+    def parse_kitchen_slip_rows(self, text: str, row: Dict) -> List[Dict]:
+        """Parse dishes from kitchen slip text (制作分单 format) into order_dishes rows based on row"""
+        dishes = [{**row, 'name': name, 'quantity': quantity} for name, quantity in _parse_kitchen_slip_dishes(text)]
         logger.info(f"Parsed {len(dishes)} dishes from kitchen slip")
         return dishes
     
     def get_station_from_text(self, text: str) -> Tuple[Optional[str], Optional[str]]:
         """Extract station name and ID from kitchen slip"""
-        if not text:
+        if not text or '档口' not in text:
             return None, None
         
-        station_match = re.search(r'档口[:：]\s*([^\n]+)', text)
+        station_match = _RE_STATION.search(text)
         if station_match:
             station_name = station_match.group(1).strip()
+            # A plain dict lookup - an lru_cache wrapper or linear scan over 8 keys is slower
             station_id = self.STATION_MAP.get(station_name)
             logger.info(f"Found station: {station_name} -> {station_id}")
             return station_name, station_id
@@ -289,44 +623,34 @@ class OrderProcessor:
         return None, None
     
     def log_to_axiom_sync(self, event_data: Dict):
-        """Send monitoring event to Axiom (synchronous version)"""
-        if not self.axiom_token:
+        """Queue monitoring event for Axiom (never blocks on the network)"""
+        if not self._http:
             return
         
         try:
-            with httpx.Client() as client:
-                response = client.post(
-                    f'https://api.axiom.co/v1/datasets/{self.axiom_dataset}/ingest',
-                    json=[{
-                        **event_data,
-                        'timestamp': datetime.utcnow().isoformat(),
-                        'source': 'local_printer_api'
-                    }],
-                    headers={
-                        'Authorization': f'Bearer {self.axiom_token}',
-                        'Content-Type': 'application/json'
-                    },
-                    timeout=5
-                )
-                if response.status_code != 200:
-                    logger.warning(f"Axiom logging returned {response.status_code}")
-        except Exception as e:
-            logger.warning(f"Axiom logging failed: {e}")
+            self._axiom_queue.put_nowait({
+                **event_data,
+                'timestamp': _now_iso(),
+                'source': 'local_printer_api'
+            })
+        except queue.Full:
+            logger.warning("Axiom queue full, dropping event")
     
-    def process_receipt(self, receipt_data: Dict) -> Dict[str, Any]:
-        """Process a receipt and send to Supabase - main entry point"""
+    def submit_receipt(self, receipt_data: Dict) -> Future:
+        """Process a receipt on the worker pool; the Future holds process_receipt's result"""
+        return self.executor.submit(self.process_receipt, receipt_data)
+    
+    def process_receipt(self, receipt_data: Dict, retry: bool = True) -> Dict[str, Any]:
+        """Process a receipt and send to Supabase - main entry point (failures are queued for retry)"""
+        receipt_no = receipt_data.get('receipt_no')
         try:
             text = receipt_data.get('plain_text', '')
-            receipt_no = receipt_data.get('receipt_no')
-            timestamp = receipt_data.get('timestamp', datetime.utcnow().isoformat())
             
             logger.info(f"Processing receipt {receipt_no}")
             
-            # Extract table number
-            table_no = self.extract_table_number(text)
-            # Override with explicit fields if present
-            if receipt_data.get('tableNumber') or receipt_data.get('table') or receipt_data.get('table_no'):
-                table_no = receipt_data.get('tableNumber') or receipt_data.get('table') or receipt_data.get('table_no')
+            # Explicit fields win; only parse the text when none are present
+            table_no = (receipt_data.get('tableNumber') or receipt_data.get('table')
+                        or receipt_data.get('table_no') or self.extract_table_number(text))
             
             # Log order received
             self.log_to_axiom_sync({
@@ -339,7 +663,8 @@ class OrderProcessor:
             should_skip, skip_reason = self.should_skip_receipt(text)
             if should_skip:
                 logger.info(f"Skipping receipt {receipt_no}: {skip_reason}")
-                if '结账单' in text:
+                # The reason already says which marker matched - no second scan of the text
+                if skip_reason == "Checkout bill logged":
                     self.log_to_axiom_sync({
                         'event': 'order.checkout',
                         'receipt_no': receipt_no,
@@ -349,24 +674,25 @@ class OrderProcessor:
             
             # Process based on type
             if self.is_kitchen_slip(receipt_data):
-                return self.process_kitchen_slip(receipt_data, text, table_no)
+                return self.process_kitchen_slip(receipt_data, text, table_no, receipt_no)
             else:
-                return self.process_customer_order(receipt_data, text, table_no)
+                return self.process_customer_order(receipt_data, text, table_no, receipt_no)
                 
         except Exception as e:
-            logger.error(f"Order processing failed for {receipt_data.get('receipt_no')}: {e}")
-            # Add to retry queue
-            self.retry_queue.put(receipt_data)
+            logger.error(f"Order processing failed for {receipt_no}: {e}")
+            # Add to retry queue (the retry worker reschedules its own failures)
+            if retry:
+                self.queue_retry(receipt_data)
             
             self.log_to_axiom_sync({
                 'event': 'order.error',
                 'error': str(e),
-                'receipt_no': receipt_data.get('receipt_no')
+                'receipt_no': receipt_no
             })
             
             raise
     
-    def process_kitchen_slip(self, receipt_data: Dict, text: str, table_no: str) -> Dict:
+    def process_kitchen_slip(self, receipt_data: Dict, text: str, table_no: str, receipt_no: str) -> Dict:
         """Process kitchen slip (制作分单)"""
         logger.info(f"Processing kitchen slip for table {table_no}")
         
@@ -374,35 +700,27 @@ class OrderProcessor:
         station_name, station_id = self.get_station_from_text(text)
         
         if not station_id:
-            logger.warning(f"No station found for kitchen slip {receipt_data.get('receipt_no')}")
+            logger.warning(f"No station found for kitchen slip {receipt_no}")
             return {'success': False, 'error': 'Station not found'}
         
-        # Parse dishes
-        dishes = self.parse_kitchen_slip_dishes(text)
+        # Parse dishes straight into order_dishes rows
+        dishes = self.parse_kitchen_slip_rows(text, {
+            **self.DISH_ROW_DEFAULTS,
+            'restaurant_id': self.RESTAURANT_ID,
+            'receipt_no': receipt_no,
+            'station_id': station_id,
+            'table_no': table_no
+        })
         
         if not dishes:
-            logger.warning(f"No dishes found in kitchen slip {receipt_data.get('receipt_no')}")
+            logger.warning(f"No dishes found in kitchen slip {receipt_no}")
             return {'success': True, 'message': 'No dishes to process'}
         
         # Insert dishes to Supabase
         if self.supabase:
-            dish_data = []
-            for dish in dishes:
-                dish_data.append({
-                    'restaurant_id': self.RESTAURANT_ID,
-                    'receipt_no': receipt_data.get('receipt_no'),
-                    'name': dish.name,
-                    'quantity': dish.quantity,
-                    'station_id': station_id,
-                    'table_no': table_no,
-                    'status': 'pending',
-                    'prep_time_minutes': 10,
-                    'urgency_level': 'normal'
-                })
-            
             try:
-                result = self.supabase.table('order_dishes').insert(dish_data).execute()
-                logger.info(f"Inserted {len(dishes)} kitchen dishes to Supabase")
+                self.queue_dishes(dishes)
+                logger.info(f"Queued {len(dishes)} kitchen dishes for Supabase")
                 
                 self.log_to_axiom_sync({
                     'event': 'kitchen_slip.processed',
@@ -410,7 +728,7 @@ class OrderProcessor:
                     'station_id': station_id,
                     'dish_count': len(dishes),
                     'table_no': table_no,
-                    'receipt_no': receipt_data.get('receipt_no')
+                    'receipt_no': receipt_no
                 })
                 
                 return {
@@ -426,7 +744,39 @@ class OrderProcessor:
         
         return {'success': False, 'error': 'Supabase not configured'}
     
-    def process_customer_order(self, receipt_data: Dict, text: str, table_no: str) -> Dict:
+    def create_order(self, order_data: Dict, dishes: List[Dict]) -> str:
+        """Insert an order with its dishes and return the order id
+
+        Uses the create_order_with_dishes RPC (one round trip, one transaction) and
+        falls back to an order insert plus batched dish rows if it isn't deployed.
+        """
+        if self._order_rpc_available:
+            try:
+                result = self.supabase.rpc('create_order_with_dishes', {
+                    'p_order': order_data,
+                    'p_dishes': dishes
+                }).execute()
+                logger.info(f"Created order {result.data} with {len(dishes)} dishes in Supabase")
+                return result.data
+            except Exception as e:
+                # PGRST202: function not found in the schema cache
+                if 'PGRST202' not in str(e):
+                    raise
+                logger.warning("create_order_with_dishes RPC not deployed, using separate inserts")
+                self._order_rpc_available = False
+        
+        order_result = self.supabase.table('order_orders').insert(order_data).execute()
+        order_id = order_result.data[0]['id']
+        logger.info(f"Created order {order_id} in Supabase")
+        
+        if dishes:
+            for dish in dishes:
+                dish['order_id'] = order_id
+            self.queue_dishes(dishes)
+            logger.info(f"Queued {len(dishes)} customer dishes for Supabase")
+        return order_id
+    
+    def process_customer_order(self, receipt_data: Dict, text: str, table_no: str, receipt_no: str) -> Dict:
         """Process customer order (客单)"""
         logger.info(f"Processing customer order for table {table_no}")
         
@@ -436,47 +786,32 @@ class OrderProcessor:
         # Create order record
         order_data = {
             'restaurant_id': self.RESTAURANT_ID,
-            'receipt_no': receipt_data.get('receipt_no'),
+            'receipt_no': receipt_no,
             'table_no': table_no,
             'order_type': 'dine_in',
             'status': 'pending',
             'raw_data': {'text': text},
-            'ordered_at': receipt_data.get('timestamp', datetime.utcnow().isoformat()),
+            'ordered_at': receipt_data.get('timestamp') or _now_iso(),  # Only format 'now' when needed
             'source': 'printer_api'
         }
         
         try:
-            # Insert order
-            order_result = self.supabase.table('order_orders').insert(order_data).execute()
-            order_id = order_result.data[0]['id']
-            logger.info(f"Created order {order_id} in Supabase")
+            # Parse dishes (order_id is filled in once the order exists)
+            dishes = self.parse_customer_rows(text, {
+                **self.DISH_ROW_DEFAULTS,
+                'restaurant_id': self.RESTAURANT_ID,
+                'receipt_no': receipt_no,
+                'station_id': None,  # Will be determined by kitchen
+                'table_no': table_no
+            })
             
-            # Parse and insert dishes
-            dishes = self.parse_customer_dishes(text)
-            
-            if dishes:
-                dish_data = []
-                for dish in dishes:
-                    dish_data.append({
-                        'order_id': order_id,
-                        'restaurant_id': self.RESTAURANT_ID,
-                        'receipt_no': receipt_data.get('receipt_no'),
-                        'name': dish.name,
-                        'quantity': dish.quantity,
-                        'station_id': None,  # Will be determined by kitchen
-                        'table_no': table_no,
-                        'status': 'pending',
-                        'prep_time_minutes': 10,
-                        'urgency_level': 'normal'
-                    })
-                
-                self.supabase.table('order_dishes').insert(dish_data).execute()
-                logger.info(f"Inserted {len(dishes)} customer dishes to Supabase")
+            # Insert order and dishes
+            order_id = self.create_order(order_data, dishes)
             
             self.log_to_axiom_sync({
                 'event': 'order.processed',
                 'order_id': order_id,
-                'receipt_no': receipt_data.get('receipt_no'),
+                'receipt_no': receipt_no,
                 'table_no': table_no,
                 'dish_count': len(dishes)
             })
@@ -497,6 +832,7 @@ class OrderProcessor:
 def test_processor():
     """Test the order processor with sample data"""
     processor = OrderProcessor()
+    processor.start()
     
     # Test customer order
     customer_receipt = {
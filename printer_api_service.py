@@ -5,19 +5,23 @@ Listens on TCP port 9100 for POS data, serves API on port 5000
 """
 
 import socket
+import selectors
 import threading
 import datetime
-import uuid
+import itertools
 import json
 import re
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import atexit
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, Any
 import queue
 import time
 import os
 import struct
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -28,8 +32,16 @@ from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from functools import wraps
+import hmac
 import hashlib
 
+# Fast JSON encoding for API responses and SSE frames (optional - stdlib json is the fallback)
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
 # Import the existing ESC/POS parser
 from virtual_printer import ESCPOSParser, PlainTextRenderer
 
@@ -46,7 +58,17 @@ limiter = Limiter(
 
 # Authentication - Use environment variable or strong default
 API_PASSWORD = os.environ.get('PRINTER_API_PASSWORD', 'DWiVVeSQtM8/S8uTlQzcg6rlJQg/H6SSHxYNnll56zo=')
-API_PASSWORD_HASH = hashlib.sha256(API_PASSWORD.encode()).hexdigest()
+API_PASSWORD_BYTES = API_PASSWORD.encode()
+
+def to_json(obj) -> bytes:
+    """Encode obj as UTF-8 JSON bytes"""
+    if ORJSON_ENABLED:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def json_response(obj, status=200):
+    """JSON response encoded with to_json (jsonify always goes through stdlib json)"""
+    return Response(to_json(obj), status=status, mimetype='application/json')
 
 def require_auth(f):
     """Decorator to require authentication for API endpoints"""
@@ -60,62 +82,123 @@ def require_auth(f):
         if not auth:
             return jsonify({'error': 'Authentication required'}), 401
         
-        # Check if password matches
-        if hashlib.sha256(auth.encode()).hexdigest() != API_PASSWORD_HASH:
+        # Constant-time compare against the configured password - no hashing per request
+        if not hmac.compare_digest(auth.encode(), API_PASSWORD_BYTES):
             # Log failed attempts
-            logger.warning(f"Failed auth attempt from {get_remote_address()}")
+            service.logger.warning(f"Failed auth attempt from {get_remote_address()}")
             return jsonify({'error': 'Invalid password'}), 403
             
         return f(*args, **kwargs)
     return decorated_function
 
+# Receipt field patterns, compiled once at import instead of looked up per line
+RECEIPT_NO_PATTERN = re.compile(r'单号[：:\s]+(\d+)')
+DIGITS_PATTERN = re.compile(r'^\d+$')
+TIMESTAMP_PATTERN = re.compile(r'时间[：:]\s*([^\n]+)')
+TIMESTAMP_SPACE_PATTERN = re.compile(r'时间\s+([^\n]+)')
+DATE_LINE_PATTERN = re.compile(r'^(?:\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})')  # ISO or MM/DD/YYYY
+
+_timestamp_cache = (0, '')
+
+def now_timestamp() -> str:
+    """Local time as 'YYYY-MM-DD HH:MM:SS', formatted at most once per second"""
+    global _timestamp_cache
+    sec = int(time.time())
+    cached_sec, cached = _timestamp_cache
+    if sec != cached_sec:
+        cached = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sec))
+        _timestamp_cache = (sec, cached)  # Single tuple swap - safe across threads
+    return cached
+
+def _lines_containing(text: str, marker: str):
+    """Yield (line, next_line) for each line of text containing marker; next_line is None on the last line"""
+    # str.find jumps straight to each marker - lines without one are never touched in Python
+    pos = text.find(marker)
+    while pos != -1:
+        start = text.rfind('\n', 0, pos) + 1
+        end = text.find('\n', pos)
+        if end == -1:
+            yield text[start:], None
+            return
+        next_end = text.find('\n', end + 1)
+        yield text[start:end], text[end + 1:next_end if next_end != -1 else len(text)]
+        pos = text.find(marker, end + 1)
+
+
 class ReceiptExtractor:
     """Extract receipt number and timestamp from plain text"""
     
     def extract_receipt_info(self, plain_text: str) -> Dict[str, str]:
         """Extract receipt number (单号) and timestamp (时间) from receipt text"""
-        lines = plain_text.split('\n')
-        
-        receipt_no = ""
-        timestamp = ""
-        
-        for i, line in enumerate(lines):
-            # Look for receipt number (单号)
-            if '单号' in line and not receipt_no:
-                # Try to extract number from same line with colon or space
-                match = re.search(r'单号[：:\s]+(\d+)', line)
-                if match:
-                    receipt_no = match.group(1)
-                else:
-                    # Otherwise check next line
-                    if i + 1 < len(lines):
-                        next_line = lines[i + 1].strip()
-                        if re.match(r'^\d+$', next_line):
-                            receipt_no = next_line
-            
-            # Look for timestamp (时间)
-            if '时间' in line and not timestamp:
-                # Try to extract timestamp from same line
-                match = re.search(r'时间[：:]\s*([^\n]+)', line)
-                if match:
-                    timestamp = match.group(1).strip()
-                else:
-                    # Check if timestamp is on same line without colon
-                    match = re.search(r'时间\s+([^\n]+)', line)
-                    if match:
-                        timestamp = match.group(1).strip()
-                    # Otherwise check next line
-                    elif i + 1 < len(lines):
-                        next_line = lines[i + 1].strip()
-                        # Check if next line looks like a timestamp
-                        if re.match(r'^\d{4}-\d{2}-\d{2}', next_line) or \
-                           re.match(r'^\d{2}/\d{2}/\d{4}', next_line):
-                            timestamp = next_line
-        
+        timestamp = self.extract_timestamp(plain_text)
         return {
-            'receipt_no': receipt_no,
-            'timestamp': timestamp if timestamp else datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'receipt_no': self.extract_receipt_no(plain_text),
+            'timestamp': timestamp if timestamp else now_timestamp()
         }
+    
+    def extract_receipt_no(self, plain_text: str) -> str:
+        """First receipt number (单号) on its own line or the line after"""
+        for line, next_line in _lines_containing(plain_text, '单号'):
+            # Try to extract number from same line with colon or space
+            match = RECEIPT_NO_PATTERN.search(line)
+            if match:
+                return match.group(1)
+            # Otherwise check next line
+            if next_line is not None:
+                next_line = next_line.strip()
+                if DIGITS_PATTERN.match(next_line):
+                    return next_line
+        return ""
+    
+    def extract_timestamp(self, plain_text: str) -> str:
+        """First timestamp (时间) on its own line or the line after; empty if none"""
+        for line, next_line in _lines_containing(plain_text, '时间'):
+            # Try to extract timestamp from same line, with or without a colon
+            match = TIMESTAMP_PATTERN.search(line) or TIMESTAMP_SPACE_PATTERN.search(line)
+            if match:
+                timestamp = match.group(1).strip()
+                if timestamp:
+                    return timestamp
+            # Otherwise check if next line looks like a timestamp
+            elif next_line is not None:
+                next_line = next_line.strip()
+                if DATE_LINE_PATTERN.match(next_line):
+                    return next_line
+        return ""
+
+
+# Concurrent POS connections served at once
+POS_WORKERS = 8
+
+# How often the accept loop re-checks for shutdown while every worker is busy
+SLOT_WAIT_TIMEOUT = 1.0
+
+# Read a whole receipt in one or two recv calls instead of one per KB
+RECV_BUFFER_SIZE = 64 * 1024
+
+# Upper bound on one print session - real receipts are a few KB
+MAX_SESSION_BYTES = 1024 * 1024
+
+# Receipt frames buffered per SSE client before new ones are dropped
+STREAM_CLIENT_QUEUE_SIZE = 64
+
+# ESC/POS opcodes checked on the connection path
+ESC_POS_CUT = b'\x1D\x56'  # GS V - cut paper
+ESC_POS_INIT = b'\x1B\x40'  # ESC @ - initialize printer
+PRINT_MODE_PREFIXES = b'\x1b\x1c\x1d'  # ESC/FS/GS before '!' - print mode, kanji mode, character size
+
+def _has_print_mode_command(data: bytes) -> bool:
+    """True if data holds ESC !, FS ! or GS ! (one scan for '!' instead of three two-byte scans)"""
+    # ASCII '!' is rare in GBK receipt text, so this usually touches each byte once
+    pos = data.find(b'!', 1)
+    while pos != -1:
+        if data[pos - 1] in PRINT_MODE_PREFIXES:
+            return True
+        pos = data.find(b'!', pos + 1)
+    return False
+
+# DLE EOT n replies by n: printer online / paper OK / no error / paper present (anything else: online)
+STATUS_RESPONSES = {1: b'\x16', 2: b'\x12', 3: b'\x12', 4: b'\x12'}
 
 
 class PrinterAPIService:
@@ -124,15 +207,30 @@ class PrinterAPIService:
     def __init__(self):
         # Memory storage (circular buffer of 500 receipts)
         self.receipts = deque(maxlen=500)
+        self.receipts_by_no = {}  # receipt_no -> buffered receipts with that number, oldest first
+        
+        # Receipt ids: per-process counter + random run prefix (no UUID object per receipt)
+        self.id_prefix = os.urandom(8).hex()
+        self.id_counter = itertools.count(1)
         self.receipt_extractor = ReceiptExtractor()
         self.escpos_parser = ESCPOSParser()
         self.plain_renderer = PlainTextRenderer()
         
-        # No threading needed - handle connections sequentially like a real printer
+        # Connections are served on a small fixed pool so one idle POS (30s timeout)
+        # can't hold up the others; the pool size also caps threads and open sockets
+        self.connection_pool = ThreadPoolExecutor(max_workers=POS_WORKERS, thread_name_prefix='pos')
+        self.connection_slots = threading.BoundedSemaphore(POS_WORKERS)
+        self.client_sockets = set()  # Open POS connections, so stop() can cut them short
+        self.client_sockets_lock = threading.Lock()
+        self.ingest_lock = threading.Lock()  # The ESC/POS parser and receipt buffer aren't thread-safe
         
-        # Real-time streaming
-        self.stream_queue = queue.Queue()
-        self.stream_clients = []
+        # Serialized list responses, reused until the next receipt arrives
+        self.receipts_version = 0
+        self.json_cache = {}  # key -> (receipts_version, body)
+        
+        # Real-time streaming (one bounded queue of pre-encoded SSE frames per client)
+        self.stream_clients = set()
+        self.stream_clients_lock = threading.Lock()
         
         # Statistics
         self.stats = {
@@ -145,15 +243,16 @@ class PrinterAPIService:
         # Setup logging
         self.setup_logging()
         
-        # TCP server flag
+        # TCP server flag, plus a socket pair that wakes the accept loop on stop()
         self.running = True
+        self.shutdown_reader, self.shutdown_writer = socket.socketpair()
         
         self.logger.info("="*60)
         self.logger.info("🖨️  Printer API Service Starting...")
         self.logger.info("="*60)
     
     def setup_logging(self):
-        """Setup rotating log file"""
+        """Setup rotating log file (rotation is size-driven by the handler)"""
         os.makedirs('logs', exist_ok=True)
         
         # Create rotating file handler
@@ -169,55 +268,64 @@ class PrinterAPIService:
         )
         handler.setFormatter(formatter)
         
-        # Setup logger
-        self.logger = logging.getLogger('printer_api')
-        self.logger.setLevel(logging.INFO)
-        self.logger.addHandler(handler)
-        
         # Also log to console
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        
+        # Setup logger - records are queued and written by a background listener,
+        # so the TCP thread never blocks on disk or console I/O
+        log_queue = queue.SimpleQueue()
+        self.log_listener = QueueListener(log_queue, handler, console_handler)
+        self.log_listener.start()
+        atexit.register(self.log_listener.stop)  # Flush queued records on exit
+        
+        self.logger = logging.getLogger('printer_api')
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(QueueHandler(log_queue))
     
     def tcp_server(self, host='0.0.0.0', port=9100):
         """TCP server listening for printer data on port 9100"""
+        selector = selectors.DefaultSelector()
         try:
             server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             server_sock.bind((host, port))
             server_sock.listen(5)
-            server_sock.settimeout(1.0)  # Allow checking self.running
+            server_sock.setblocking(False)  # Only accepted after the selector reports it ready
+            
+            # Sleep until a POS connects or stop() is called - no periodic wake-ups
+            selector.register(server_sock, selectors.EVENT_READ)
+            selector.register(self.shutdown_reader, selectors.EVENT_READ)
             
             self.logger.info(f"📡 TCP Server listening on {host}:{port}")
             print(f"✅ TCP Server ready on port {port}")
             
             while self.running:
                 try:
+                    events = selector.select()
+                    if any(key.fileobj is self.shutdown_reader for key, _ in events):
+                        break
                     client_sock, client_addr = server_sock.accept()
                     
                     # Set aggressive timeout to prevent hanging
                     client_sock.settimeout(5.0)  # 5 second timeout for all operations
                     
-                    # Handle connection directly - no threads at all
+                    # Hand off to a worker; wait for a free one rather than queueing sockets,
+                    # but keep checking so stop() isn't held up behind busy workers
+                    while self.running and not self.connection_slots.acquire(timeout=SLOT_WAIT_TIMEOUT):
+                        pass
+                    if not self.running:
+                        client_sock.close()
+                        break
                     try:
-                        self.handle_printer_connection(client_sock, client_addr)
-                    except socket.timeout:
-                        self.logger.warning(f"Connection from {client_addr} timed out")
-                    except Exception as e:
-                        self.logger.error(f"Error handling connection from {client_addr}: {e}")
-                    finally:
-                        # Always close the connection after handling
-                        try:
-                            client_sock.shutdown(socket.SHUT_RDWR)
-                        except:
-                            pass
-                        try:
-                            client_sock.close()
-                        except:
-                            pass
+                        self.connection_pool.submit(self.serve_connection, client_sock, client_addr)
+                    except RuntimeError:  # Pool already shut down by stop()
+                        self.connection_slots.release()
+                        client_sock.close()
+                        break
                         
-                except socket.timeout:
-                    continue
+                except BlockingIOError:
+                    continue  # The pending connection went away before accept
                 except OSError as e:
                     if e.errno == 24:  # Too many open files
                         self.logger.error(f"File descriptor limit reached! Sleeping...")
@@ -233,39 +341,86 @@ class PrinterAPIService:
             self.logger.error(f"❌ Failed to start TCP server on port {port}: {e}")
             print(f"❌ Could not bind to port {port}. Is another service using it?")
         finally:
+            selector.close()
             server_sock.close()
     
+    def serve_connection(self, client_sock, client_addr):
+        """Worker-pool entry point: handle one connection, then always close it and free its slot"""
+        with self.client_sockets_lock:
+            self.client_sockets.add(client_sock)
+        try:
+            self.handle_printer_connection(client_sock, client_addr)
+        except socket.timeout:
+            self.logger.warning(f"Connection from {client_addr} timed out")
+        except Exception as e:
+            self.logger.error(f"Error handling connection from {client_addr}: {e}")
+        finally:
+            # Always close the connection after handling
+            with self.client_sockets_lock:
+                self.client_sockets.discard(client_sock)
+            try:
+                client_sock.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
+            try:
+                client_sock.close()
+            except:
+                pass
+            self.connection_slots.release()
+    
+    def stop(self):
+        """Stop the TCP server, waking its accept loop and releasing its workers immediately"""
+        self.running = False
+        self.shutdown_writer.send(b'x')
+        self.connection_pool.shutdown(wait=False, cancel_futures=True)
+        
+        # Pool threads are joined at exit - unblock any still waiting on a POS read
+        with self.client_sockets_lock:
+            open_sockets = list(self.client_sockets)
+        for client_sock in open_sockets:
+            try:
+                client_sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
     def handle_printer_connection(self, client_sock, client_addr):
         """Handle incoming printer data - using exact logic from virtual_printer.py"""
         # Don't log every connection - too noisy with POS status checks
         
         # Set socket options to prevent file descriptor leaks
         client_sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Send status replies immediately - the POS waits on each one
+        client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         # Don't use SO_LINGER - let the OS handle proper TCP closure
         # client_sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, 
         #                        struct.pack('ii', 1, 0))  # This can cause CLOSE-WAIT
         
         session_data = []
-        last_data_time = time.time()
+        session_size = 0
         idle_timeout = 30.0  # 30 seconds idle timeout like virtual_printer
         is_initialization = False
         
         try:
-            client_sock.settimeout(1.0)  # 1 second socket timeout
+            # recv itself times out after the idle period - no 1 second polling
+            client_sock.settimeout(idle_timeout)
             
             while True:
                 try:
-                    data = client_sock.recv(1024)
+                    data = client_sock.recv(RECV_BUFFER_SIZE)
                     if not data:
                         # Empty data means connection closed by peer
                         break  # Exit immediately, don't wait for timeout
                         # Remove the sleep and timeout check here
                     
-                    last_data_time = time.time()
                     session_data.append(data)
+                    session_size += len(data)
+                    if session_size > MAX_SESSION_BYTES:
+                        # A client that never stops sending must not grow the buffer (and parse) without limit
+                        self.logger.warning(f"Session from {client_addr[0]} exceeded {MAX_SESSION_BYTES} bytes, closing")
+                        break
                     
-                    # Check for initialization sequence
-                    if b'\x1b\x21' in data or b'\x1c\x21' in data or b'\x1d\x21' in data:
+                    # Check for initialization sequence (once seen, later chunks aren't scanned)
+                    if not is_initialization and _has_print_mode_command(data):
                         is_initialization = True
                     
                     # Generate smart response (handshaking)
@@ -274,11 +429,8 @@ class PrinterAPIService:
                         client_sock.send(response)
                         
                 except socket.timeout:
-                    # Check if we've been idle too long
-                    if time.time() - last_data_time > idle_timeout:
-                        break
-                    # No sleep needed - timeout already provides delay
-                    continue
+                    # Idle too long
+                    break
                 except ConnectionResetError:
                     # POS disconnected (normal)
                     break
@@ -295,99 +447,89 @@ class PrinterAPIService:
                 pass  # Socket may already be closed
             client_sock.close()
             
-            # Process accumulated data (like virtual_printer does)
+            # Process accumulated data (like virtual_printer does); sessions from
+            # concurrent connections are parsed and stored one at a time
             if session_data:
-                complete_data = b''.join(session_data)
-                # Only log if it's actual receipt data, not status checks
-                if len(complete_data) > 50:
-                    self.logger.info(f"Session complete: {len(complete_data)} bytes from {client_addr[0]}")
+                with self.ingest_lock:
+                    self.process_session(session_data, client_addr)
+    
+    def process_session(self, session_data, client_addr):
+        """Parse a finished print session and store it as a receipt (caller holds ingest_lock)"""
+        complete_data = b''.join(session_data)
+        # Only log if it's actual receipt data, not status checks
+        if len(complete_data) > 50:
+            self.logger.info(f"Session complete: {len(complete_data)} bytes from {client_addr[0]}")
+        
+        # Actual print content if large enough, or a short job carrying
+        # a cut or init command (length first - the scans only run on short sessions)
+        has_text = (len(complete_data) > 50
+                    or ESC_POS_CUT in complete_data
+                    or ESC_POS_INIT in complete_data)
+            
+        if has_text:
+            # Parse ESC/POS to plain text
+            try:
+                commands = self.escpos_parser.parse(complete_data)
+                plain_text = self.plain_renderer.render(commands)
                 
-                # Check if this is actual print content
-                has_text = False
-                has_cut = b'\x1D\x56' in complete_data  # Cut command
-                has_init = b'\x1B\x40' in complete_data  # Init command
+                # Extract receipt info
+                receipt_info = self.receipt_extractor.extract_receipt_info(plain_text)
                 
-                # If has init or cut command, or data is large enough
-                if (len(complete_data) > 50) or has_cut or has_init:
-                    has_text = True
-                    
-                if has_text:
-                    # Parse ESC/POS to plain text
-                    try:
-                        commands = self.escpos_parser.parse(complete_data)
-                        plain_text = self.plain_renderer.render(commands)
-                        
-                        # Extract receipt info
-                        receipt_info = self.receipt_extractor.extract_receipt_info(plain_text)
-                        
-                        # Create receipt object
-                        receipt = {
-                            'id': str(uuid.uuid4()),
-                            'receipt_no': receipt_info['receipt_no'],
-                            'timestamp': receipt_info['timestamp'],
-                            'plain_text': plain_text
-                        }
-                        
-                        # Store in memory
-                        self.receipts.append(receipt)
-                        
-                        # Update stats
-                        self.stats['total_received'] += 1
-                        self.stats['last_receipt_time'] = datetime.datetime.now().isoformat()
-                        
-                        # Log success
-                        self.logger.info(f"✅ Receipt processed - No: {receipt['receipt_no'] or 'N/A'}, ID: {receipt['id'][:8]}")
-                        print(f"\n{'='*60}")
-                        print(f"📋 Receipt #{self.stats['total_received']}")
-                        print(f"📱 From: {client_addr[0]}")
-                        print(f"📦 Size: {len(complete_data)} bytes")
-                        print(f"🔢 Receipt No: {receipt['receipt_no'] or 'N/A'}")
-                        print(f"="*60)
-                        
-                        # Send to real-time stream
-                        self.broadcast_receipt(receipt)
-                        
-                    except Exception as e:
-                        self.logger.error(f"Parse error: {e}")
-                        self.stats['parse_errors'] += 1
-                        
-                        # Store with empty fields on error
-                        receipt = {
-                            'id': str(uuid.uuid4()),
-                            'receipt_no': '',
-                            'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'plain_text': f"[Parse Error: {str(e)}]"
-                        }
-                        self.receipts.append(receipt)
-                        print(f"⚠️ Parse error, stored with empty receipt_no")
-                else:
-                    # This is just a status query, ignore
-                    self.logger.debug(f"Status query: {len(complete_data)} bytes")
+                # Create receipt object
+                receipt = {
+                    'id': self.new_receipt_id(),
+                    'receipt_no': receipt_info['receipt_no'],
+                    'timestamp': receipt_info['timestamp'],
+                    'plain_text': plain_text
+                }
+                
+                # Store in memory
+                self.store_receipt(receipt)
+                
+                # Update stats
+                self.stats['total_received'] += 1
+                self.stats['last_receipt_time'] = datetime.datetime.now().isoformat()
+                
+                # Log success
+                self.logger.info(f"✅ Receipt processed - No: {receipt['receipt_no'] or 'N/A'}, ID: {receipt['id'][:8]}")
+                # One write for the whole banner, newline included - print() would add a
+                # second write for it (stdout is unbuffered under systemd)
+                sys.stdout.write(f"\n{'='*60}\n"
+                                 f"📋 Receipt #{self.stats['total_received']}\n"
+                                 f"📱 From: {client_addr[0]}\n"
+                                 f"📦 Size: {len(complete_data)} bytes\n"
+                                 f"🔢 Receipt No: {receipt['receipt_no'] or 'N/A'}\n"
+                                 f"{'='*60}\n")
+                
+                # Send to real-time stream
+                self.broadcast_receipt(receipt)
+                
+            except Exception as e:
+                self.logger.error(f"Parse error: {e}")
+                self.stats['parse_errors'] += 1
+                
+                # Store with empty fields on error
+                receipt = {
+                    'id': self.new_receipt_id(),
+                    'receipt_no': '',
+                    'timestamp': now_timestamp(),
+                    'plain_text': f"[Parse Error: {str(e)}]"
+                }
+                self.store_receipt(receipt)
+                print(f"⚠️ Parse error, stored with empty receipt_no")
+        else:
+            # This is just a status query, ignore
+            self.logger.debug(f"Status query: {len(complete_data)} bytes")
     
     def get_response(self, data, is_initialization=False):
         """Generate response for ESC/POS commands (from virtual_printer.py)"""
-        i = 0
         responses = []
-        has_status_query = False
         
-        while i < len(data):
-            # DLE EOT status query
-            if i + 2 < len(data) and data[i:i+2] == b'\x10\x04':
-                cmd_type = data[i+2] if i+2 < len(data) else 0
-                has_status_query = True
-                if cmd_type == 1:
-                    responses.append(b'\x16')  # Printer online
-                elif cmd_type == 2:
-                    responses.append(b'\x12')  # Paper OK
-                elif cmd_type == 3:
-                    responses.append(b'\x12')  # No error
-                elif cmd_type == 4:
-                    responses.append(b'\x12')  # Paper present
-                else:
-                    responses.append(b'\x16')
-                i += 3
-            else:
-                i += 1
+        # DLE EOT n status queries - bytes.find jumps between them instead of stepping byte by byte
+        pos = data.find(b'\x10\x04')
+        while pos != -1 and pos + 2 < len(data):
+            responses.append(STATUS_RESPONSES.get(data[pos + 2], b'\x16'))
+            pos = data.find(b'\x10\x04', pos + 3)
         
         # Return responses for status queries
         if responses:
@@ -403,23 +545,49 @@ class PrinterAPIService:
             
         return None
     
+    def new_receipt_id(self):
+        """Unique receipt id; the counter comes first so the logged 8-char short id stays distinct"""
+        return f"{next(self.id_counter):08x}{self.id_prefix}"
+    
+    def store_receipt(self, receipt):
+        """Add a receipt to the in-memory buffer, keeping the receipt_no index and cached list responses in step"""
+        if len(self.receipts) == self.receipts.maxlen:
+            # The deque is about to drop its oldest receipt - drop it from the index too
+            evicted_no = self.receipts[0]['receipt_no']
+            bucket = self.receipts_by_no.get(evicted_no)
+            if bucket:
+                bucket.pop(0)
+                if not bucket:
+                    del self.receipts_by_no[evicted_no]
+        self.receipts.append(receipt)
+        if receipt['receipt_no']:
+            self.receipts_by_no.setdefault(receipt['receipt_no'], []).append(receipt)
+        self.receipts_version += 1
+    
+    def get_cached_json(self, key, build):
+        """JSON body for build(), serialized once per change to the receipt buffer"""
+        # Read the version first: a receipt landing mid-build just forces a rebuild next time
+        version = self.receipts_version
+        cached = self.json_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        body = to_json(build())
+        self.json_cache[key] = (version, body)
+        return body
+    
     def broadcast_receipt(self, receipt):
         """Send receipt to all SSE stream clients"""
-        # Add to stream queue
-        self.stream_queue.put(receipt)
+        # Encode the frame once and fan the same bytes out to every client
+        frame = b'data: ' + to_json(receipt) + b'\n\n'
         
-        # Notify all connected clients
-        for client_queue in self.stream_clients:
+        # Notify all connected clients (snapshot so joins/leaves don't race the loop)
+        with self.stream_clients_lock:
+            clients = tuple(self.stream_clients)
+        for client_queue in clients:
             try:
-                client_queue.put(receipt)
-            except:
-                pass
-    
-    def check_log_rotation(self):
-        """Check if we need to rotate logs (every 2000 receipts)"""
-        if self.stats['total_received'] % 2000 == 0 and self.stats['total_received'] > 0:
-            self.logger.info(f"Log rotation at {self.stats['total_received']} receipts")
-            # The RotatingFileHandler will handle this automatically based on size
+                client_queue.put_nowait(frame)
+            except queue.Full:
+                pass  # Slow client - drop the frame rather than buffer without limit
 
 
 # Initialize service
@@ -433,7 +601,7 @@ def health_check():
     """Health check endpoint"""
     uptime = (datetime.datetime.now() - service.stats['start_time']).total_seconds()
     
-    return jsonify({
+    return json_response({
         'status': 'ok',
         'receipts_count': len(service.receipts),
         'total_received': service.stats['total_received'],
@@ -446,14 +614,15 @@ def health_check():
 @require_auth
 def get_recent():
     """Get last 10 receipts for testing"""
-    recent = list(service.receipts)[-10:]
-    return jsonify(recent)
+    body = service.get_cached_json('recent', lambda: list(service.receipts)[-10:])
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/receipts', methods=['GET'])
 @require_auth
 def get_all_receipts():
     """Get all stored receipts (up to 500)"""
-    return jsonify(list(service.receipts))
+    body = service.get_cached_json('all', lambda: list(service.receipts))
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/search', methods=['GET'])
 @require_auth
@@ -464,12 +633,10 @@ def search_receipts():
     if not receipt_no:
         return jsonify({'error': 'Please provide receipt number with ?no=XXX'}), 400
     
-    results = [
-        r for r in service.receipts 
-        if r['receipt_no'] == receipt_no
-    ]
+    # Index lookup instead of scanning the whole buffer (copied so ingest can't mutate it mid-encode)
+    results = list(service.receipts_by_no.get(receipt_no, ()))
     
-    return jsonify(results)
+    return json_response(results)
 
 @app.route('/api/stream', methods=['GET'])
 @require_auth
@@ -477,27 +644,27 @@ def stream_receipts():
     """Server-Sent Events endpoint for real-time receipts"""
     def generate():
         # Create a queue for this client
-        client_queue = queue.Queue()
-        service.stream_clients.append(client_queue)
+        client_queue = queue.Queue(maxsize=STREAM_CLIENT_QUEUE_SIZE)
+        with service.stream_clients_lock:
+            service.stream_clients.add(client_queue)
         
         try:
             # Send initial connection message
-            yield f"data: {json.dumps({'type': 'connected', 'message': 'Stream connected'})}\n\n"
+            yield b'data: ' + to_json({'type': 'connected', 'message': 'Stream connected'}) + b'\n\n'
             
             # Keep connection alive and send receipts
             while True:
                 try:
-                    # Wait for new receipt (with timeout for keepalive)
-                    receipt = client_queue.get(timeout=30)
-                    yield f"data: {json.dumps(receipt)}\n\n"
+                    # Wait for the next receipt frame (with timeout for keepalive)
+                    yield client_queue.get(timeout=30)
                 except queue.Empty:
                     # Send keepalive
                     yield f": keepalive\n\n"
                     
         finally:
             # Remove client queue on disconnect
-            if client_queue in service.stream_clients:
-                service.stream_clients.remove(client_queue)
+            with service.stream_clients_lock:
+                service.stream_clients.discard(client_queue)
     
     return Response(
         generate(),
@@ -509,10 +676,8 @@ def stream_receipts():
         }
     )
 
-@app.route('/')
-def index():
-    """Enhanced web dashboard for monitoring"""
-    html = """
+# Dashboard page - static, so it is encoded and hashed once at import
+INDEX_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -1119,7 +1284,17 @@ def index():
     </body>
     </html>
     """
-    return html
+INDEX_HTML_BYTES = INDEX_HTML.encode('utf-8')
+INDEX_ETAG = hashlib.sha256(INDEX_HTML_BYTES).hexdigest()[:16]
+
+@app.route('/')
+def index():
+    """Enhanced web dashboard for monitoring"""
+    # Browsers revalidate after an hour and get a bodiless 304 while the page is unchanged
+    headers = {'ETag': f'"{INDEX_ETAG}"', 'Cache-Control': 'public, max-age=3600'}
+    if INDEX_ETAG in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(INDEX_HTML_BYTES, mimetype='text/html', headers=headers)
 
 
 def main():
@@ -1150,7 +1325,10 @@ def main():
     print("\n✅ Service running! Press Ctrl+C to stop.\n")
     
     # Start Flask API server without threading (to prevent thread explosion with SSE)
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=False)
+    try:
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=False)
+    finally:
+        service.stop()
 
 
 if __name__ == '__main__':
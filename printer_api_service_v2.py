@@ -7,7 +7,7 @@ With SQLite persistence, connection pooling, and reliability improvements
 import socket
 import threading
 import datetime
-import uuid
+import itertools
 import json
 import re
 import logging
@@ -27,13 +27,14 @@ import sys
 # Load environment variables
 load_dotenv()
 
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
-from dashboard import get_dashboard_html
+from dashboard import get_dashboard_bytes, dashboard_not_modified, get_dashboard_not_modified_headers, get_static_asset
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from functools import wraps
 import hashlib
+import secrets
 
 # Import the existing ESC/POS parser
 from virtual_printer import ESCPOSParser, PlainTextRenderer
@@ -46,6 +47,30 @@ except ImportError:
     SUPABASE_ENABLED = False
     print("⚠️ OrderProcessor not available, Supabase integration disabled")
 
+# WebSocket push channel for the dashboard (optional - dashboard falls back to polling)
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+    WEBSOCKET_ENABLED = True
+except ImportError:
+    WEBSOCKET_ENABLED = False
+    print("⚠️ flask-sock not available, dashboard live updates will use polling")
+
+# Fast JSON encoding for dashboard push events (optional - stdlib json is the fallback)
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
+# gevent's native threadpool for blocking work (optional - only used under gunicorn's gevent worker)
+try:
+    from gevent import get_hub
+    from gevent.monkey import is_module_patched
+    GEVENT_ENABLED = True
+except ImportError:
+    GEVENT_ENABLED = False
+
 app = Flask(__name__)
 CORS(app)
 
@@ -67,11 +92,66 @@ CONNECTION_POOL_SIZE = 10
 DATABASE_PATH = '/home/smartahc/smartice/printer_faker/receipts.db'
 CLOUDFLARE_RETRY_QUEUE_SIZE = 1000
 MAX_MEMORY_RECEIPTS = 500  # Keep last 500 in memory for fast access
+EXPORT_BATCH_SIZE = 50  # Receipts copied out of the cache per lock hold while exporting
+RECV_BUFFER_SIZE = 64 * 1024  # Whole receipt in one or two recv calls
+DASHBOARD_CLIENT_QUEUE_SIZE = 100  # Pending push events per dashboard socket
+DASHBOARD_PING_INTERVAL = 30  # Seconds between keepalive frames
+SESSION_COOKIE = 'sid'
+SESSION_TTL = 86400  # Dashboard login lasts 24 hours
+
+def is_valid_password(auth):
+    """Check a supplied password against the configured API password"""
+    if not auth:
+        return False
+    return hashlib.sha256(auth.encode()).hexdigest() == API_PASSWORD_HASH
+
+class SessionStore:
+    """In-memory dashboard sessions keyed by an opaque cookie token"""
+    
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self.sessions = {}  # token -> expiry timestamp
+        self.lock = threading.Lock()
+    
+    def create(self):
+        """Issue a new session token"""
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        with self.lock:
+            # Prune expired sessions on login so the dict can't grow unbounded
+            for expired in [t for t, expiry in self.sessions.items() if expiry < now]:
+                del self.sessions[expired]
+            self.sessions[token] = now + self.ttl
+        return token
+    
+    def is_valid(self, token):
+        """Check a token from the session cookie (dict lookup, no hashing)"""
+        if not token:
+            return False
+        with self.lock:
+            expiry = self.sessions.get(token)
+            if expiry is None:
+                return False
+            if expiry < time.time():
+                del self.sessions[token]
+                return False
+            return True
+    
+    def revoke(self, token):
+        """End a session on logout"""
+        with self.lock:
+            self.sessions.pop(token, None)
+
+sessions = SessionStore()
 
 def require_auth(f):
     """Decorator to require authentication for API endpoints"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        # Dashboard sessions use a cookie; API clients keep sending the password
+        if sessions.is_valid(request.cookies.get(SESSION_COOKIE)):
+            return f(*args, **kwargs)
+        
         auth = request.headers.get('Authorization')
         if not auth:
             auth = request.args.get('auth')
@@ -79,15 +159,41 @@ def require_auth(f):
         if not auth:
             return jsonify({'error': 'Authentication required'}), 401
         
-        if hashlib.sha256(auth.encode()).hexdigest() != API_PASSWORD_HASH:
-            logger.warning(f"Failed auth attempt from {get_remote_address()}")
+        if not is_valid_password(auth):
+            service.logger.warning(f"Failed auth attempt from {get_remote_address()}")
             return jsonify({'error': 'Invalid password'}), 403
             
         return f(*args, **kwargs)
     return decorated_function
 
+# Under the gevent worker every thread is a greenlet on one hub, and sqlite calls or
+# ESC/POS parsing never yield - they run on the hub's native threadpool instead.
+# start() enables the pool in the worker process; until then (and without gevent)
+# blocking calls run inline, so the gunicorn master never starts native threads.
+blocking_pool = None
+
+def use_gevent_threadpool():
+    """Route run_blocking() through gevent's native threadpool if threading is monkey-patched"""
+    global blocking_pool
+    if GEVENT_ENABLED and is_module_patched('threading'):
+        blocking_pool = get_hub().threadpool
+
+def run_blocking(func, *args, **kwargs):
+    """Call func on a native thread under the gevent worker (only the calling greenlet waits)"""
+    pool = blocking_pool
+    if pool is None:
+        return func(*args, **kwargs)
+    return pool.apply(func, args, kwargs)
+
+def blocking(method):
+    """Decorator for methods that must not run on the gevent hub"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        return run_blocking(method, *args, **kwargs)
+    return wrapper
+
 class DatabaseManager:
-    """Manages SQLite database for receipt persistence"""
+    """Manages SQLite database for receipt persistence (public queries run via run_blocking)"""
     
     def __init__(self, db_path):
         self.db_path = db_path
@@ -122,6 +228,13 @@ class DatabaseManager:
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_synced ON receipts(synced_to_cloudflare);
             ''')
+            
+            # Add display fields parsed at ingest (older databases don't have them)
+            cursor.execute('PRAGMA table_info(receipts)')
+            columns = {row['name'] for row in cursor.fetchall()}
+            for column in ('table_no', 'order_type'):
+                if column not in columns:
+                    cursor.execute(f'ALTER TABLE receipts ADD COLUMN {column} TEXT')
             conn.commit()
     
     @contextmanager
@@ -138,35 +251,55 @@ class DatabaseManager:
         else:
             self._local.conn.commit()
     
+    @blocking
     def save_receipt(self, receipt: Dict, raw_data: bytes = None, source_ip: str = None):
         """Save receipt to database"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO receipts 
-                (id, receipt_no, timestamp, plain_text, raw_data, source_ip)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (id, receipt_no, timestamp, plain_text, raw_data, source_ip, table_no, order_type)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 receipt['id'],
                 receipt.get('receipt_no', ''),
                 receipt.get('timestamp', ''),
                 receipt.get('plain_text', ''),
                 raw_data,
-                source_ip
+                source_ip,
+                receipt.get('table_no'),
+                receipt.get('order_type')
             ))
     
+    @blocking
     def get_recent_receipts(self, limit=10):
         """Get recent receipts from database"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT id, receipt_no, timestamp, plain_text, source_ip, created_at
+                SELECT id, receipt_no, timestamp, plain_text, source_ip, created_at,
+                       table_no, order_type
                 FROM receipts
                 ORDER BY created_at DESC
                 LIMIT ?
             ''', (limit,))
             return [dict(row) for row in cursor.fetchall()]
     
+    @blocking
+    def get_receipt(self, receipt_id):
+        """Get a single receipt by id"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, receipt_no, timestamp, plain_text, source_ip, created_at,
+                       table_no, order_type
+                FROM receipts
+                WHERE id = ?
+            ''', (receipt_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    @blocking
     def get_unsynced_receipts(self, limit=100):
         """Get receipts not yet synced to Cloudflare"""
         with self.get_connection() as conn:
@@ -180,6 +313,7 @@ class DatabaseManager:
             ''', (limit,))
             return [dict(row) for row in cursor.fetchall()]
     
+    @blocking
     def mark_as_synced(self, receipt_ids):
         """Mark receipts as synced to Cloudflare"""
         if not receipt_ids:
@@ -193,6 +327,7 @@ class DatabaseManager:
                 WHERE id IN ({placeholders})
             ''', receipt_ids)
     
+    @blocking
     def cleanup_old_receipts(self, days=30):
         """Clean up receipts older than specified days"""
         with self.get_connection() as conn:
@@ -202,6 +337,37 @@ class DatabaseManager:
                 WHERE created_at < datetime('now', '-' || ? || ' days')
             ''', (days,))
             return cursor.rowcount
+    
+    @blocking
+    def search_receipts(self, receipt_no, limit=10):
+        """Receipts with the given receipt number, newest first"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, receipt_no, timestamp, plain_text, created_at
+                FROM receipts
+                WHERE receipt_no = ?
+                ORDER BY created_at DESC
+                LIMIT ?
+            ''', (receipt_no, limit))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    @blocking
+    def get_counts(self):
+        """Total, today's and unsynced receipt counts"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) as total FROM receipts')
+            total = cursor.fetchone()['total']
+            cursor.execute('''
+                SELECT COUNT(*) as today 
+                FROM receipts 
+                WHERE date(created_at) = date('now')
+            ''')
+            today = cursor.fetchone()['today']
+            cursor.execute('SELECT COUNT(*) as unsynced FROM receipts WHERE synced_to_cloudflare = 0')
+            unsynced = cursor.fetchone()['unsynced']
+            return {'total': total, 'today': today, 'unsynced': unsynced}
 
 class CloudflareQueue:
     """Manages retry queue for Cloudflare transmissions"""
@@ -248,6 +414,39 @@ class CloudflareQueue:
                 logger.error(f"Cloudflare retry worker error: {e}")
                 time.sleep(60)  # Wait longer on error
 
+class DashboardBroadcaster:
+    """Fans out dashboard events to connected WebSocket clients"""
+    
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self.clients = []
+        self.lock = threading.Lock()
+    
+    def subscribe(self):
+        """Register a new client and return its event queue"""
+        client_queue = queue.Queue(maxsize=self.max_pending)
+        with self.lock:
+            self.clients.append(client_queue)
+        return client_queue
+    
+    def unsubscribe(self, client_queue):
+        """Remove a client queue on disconnect"""
+        with self.lock:
+            if client_queue in self.clients:
+                self.clients.remove(client_queue)
+    
+    def publish(self, event):
+        """Serialize an event once and queue it for every client"""
+        # WebSocket text frames need str, so orjson's bytes are decoded once here too
+        message = orjson.dumps(event).decode('utf-8') if ORJSON_ENABLED else json.dumps(event)
+        with self.lock:
+            clients = list(self.clients)
+        for client_queue in clients:
+            try:
+                client_queue.put_nowait(message)
+            except queue.Full:
+                pass  # Slow client - it resyncs over REST when it reconnects
+
 class ConnectionPool:
     """Manages a pool of connections with proper resource management"""
     
@@ -280,36 +479,111 @@ class ConnectionPool:
                 'available': self.max_connections - self.active_connections
             }
 
+# Display fields for the dashboard, parsed once at ingest
+PREVIEW_PATTERN = re.compile(r'\S[^\n]*(?:\n\s*\S[^\n]*)?')  # First two non-empty lines
+PREVIEW_JOIN_PATTERN = re.compile(r'\n\s*')
+DISPLAY_FIELDS_PATTERN = re.compile(r'(?:桌号|台号)[:：]([^\n:：]*)|(制作分单)|(客单)')
+PREVIEW_MAX_LENGTH = 150
+
+# Receipt number / timestamp patterns, compiled once instead of looked up per line
+RECEIPT_NO_PATTERN = re.compile(r'单号[：:\s]+(\d+)')
+DIGITS_PATTERN = re.compile(r'^\d+$')
+TIMESTAMP_PATTERN = re.compile(r'时间[：:]\s*([^\n]+)')
+
+_timestamp_cache = (0, '')
+
+def now_timestamp() -> str:
+    """Local time as 'YYYY-MM-DD HH:MM:SS', formatted at most once per second"""
+    global _timestamp_cache
+    sec = int(time.time())
+    cached_sec, cached = _timestamp_cache
+    if sec != cached_sec:
+        cached = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sec))
+        _timestamp_cache = (sec, cached)  # Single tuple swap - safe across threads
+    return cached
+
+def lines_containing(text, marker):
+    """Yield (line, next_line) for each line of text containing marker; next_line is None on the last line"""
+    # str.find jumps from marker to marker - lines without one are never touched in Python
+    pos = text.find(marker)
+    while pos != -1:
+        start = text.rfind('\n', 0, pos) + 1
+        end = text.find('\n', pos)
+        if end == -1:
+            yield text[start:], None
+            return
+        next_end = text.find('\n', end + 1)
+        yield text[start:end], text[end + 1:next_end if next_end != -1 else len(text)]
+        pos = text.find(marker, end + 1)
+
 class ReceiptExtractor:
     """Extract receipt number and timestamp from plain text"""
     
+    def extract_display_fields(self, plain_text: str) -> Dict[str, str]:
+        """Extract table number, order type and list preview for the dashboard"""
+        table_no = 'N/A'
+        order_type = 'Receipt'
+        # Last match wins, like reading the receipt top to bottom
+        for match in DISPLAY_FIELDS_PATTERN.finditer(plain_text or ''):
+            if match.group(2):
+                order_type = 'Kitchen Slip'
+            elif match.group(3):
+                order_type = 'Customer Order'
+            else:
+                table_no = match.group(1).strip() or 'N/A'
+        
+        preview_match = PREVIEW_PATTERN.search(plain_text or '')
+        if preview_match:
+            preview = PREVIEW_JOIN_PATTERN.sub(' | ', preview_match.group(0), count=1)[:PREVIEW_MAX_LENGTH]
+        else:
+            preview = '[Empty Receipt]'
+        
+        return {'table_no': table_no, 'order_type': order_type, 'preview': preview}
+    
     def extract_receipt_info(self, plain_text: str) -> Dict[str, str]:
         """Extract receipt number and timestamp from receipt text"""
-        lines = plain_text.split('\n')
-        receipt_no = ""
-        timestamp = ""
-        
-        for i, line in enumerate(lines):
-            if '单号' in line and not receipt_no:
-                match = re.search(r'单号[：:\s]+(\d+)', line)
-                if match:
-                    receipt_no = match.group(1)
-                elif i + 1 < len(lines):
-                    next_line = lines[i + 1].strip()
-                    if re.match(r'^\d+$', next_line):
-                        receipt_no = next_line
-            
-            if '时间' in line and not timestamp:
-                match = re.search(r'时间[：:]\s*([^\n]+)', line)
-                if match:
-                    timestamp = match.group(1).strip()
-                elif i + 1 < len(lines):
-                    timestamp = lines[i + 1].strip()
-        
         return {
-            'receipt_no': receipt_no,
-            'timestamp': timestamp or datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'receipt_no': self.extract_receipt_no(plain_text),
+            'timestamp': self.extract_timestamp(plain_text) or now_timestamp()
         }
+    
+    def extract_receipt_no(self, plain_text: str) -> str:
+        """First receipt number (单号) on its line or the next"""
+        for line, next_line in lines_containing(plain_text, '单号'):
+            match = RECEIPT_NO_PATTERN.search(line)
+            if match:
+                return match.group(1)
+            if next_line is not None:
+                next_line = next_line.strip()
+                if DIGITS_PATTERN.match(next_line):
+                    return next_line
+        return ""
+    
+    def extract_timestamp(self, plain_text: str) -> str:
+        """First timestamp (时间) after a colon on its line, else the next line; empty if none"""
+        for line, next_line in lines_containing(plain_text, '时间'):
+            match = TIMESTAMP_PATTERN.search(line)
+            if match:
+                timestamp = match.group(1).strip()
+            elif next_line is not None:
+                timestamp = next_line.strip()
+            else:
+                continue
+            if timestamp:
+                return timestamp
+        return ""
+
+def summarize_receipt(receipt):
+    """Receipt without plain_text for dashboard list views (detail is fetched on open)"""
+    return {key: value for key, value in receipt.items() if key != 'plain_text'}
+
+# Dashboard-only fields from extract_display_fields
+DISPLAY_FIELDS = ('table_no', 'order_type', 'preview')
+
+def order_receipt(receipt):
+    """Receipt as handed to the OrderProcessor - without the display fields, whose
+    table_no would override the processor's own table number parsing"""
+    return {key: value for key, value in receipt.items() if key not in DISPLAY_FIELDS}
 
 class PrinterAPIService:
     """Main API Service with enhanced reliability"""
@@ -331,11 +605,17 @@ class PrinterAPIService:
         self.cloudflare_queue = CloudflareQueue(self.db_manager)
         
         # In-memory cache for recent receipts (fast access)
+        # Each cached receipt carries a monotonic 'seq' so clients can ask for deltas
         self.receipts = deque(maxlen=MAX_MEMORY_RECEIPTS)
+        self.receipts_lock = threading.Lock()
+        self.receipt_seq = 0
+        
+        # Receipt ids: per-process random prefix + counter (persisted as the SQLite key)
+        self.id_prefix = os.urandom(8).hex()
+        self.id_counter = itertools.count(1)
         
-        # ESC/POS parser
-        self.escpos_parser = ESCPOSParser()
-        self.plain_renderer = PlainTextRenderer()
+        # Receipt field extraction (stateless; the ESC/POS parser and renderer keep
+        # per-receipt state, so parse_receipt builds fresh ones for each session)
         self.receipt_extractor = ReceiptExtractor()
         
         # Initialize OrderProcessor for local Supabase integration
@@ -357,15 +637,15 @@ class PrinterAPIService:
             'supabase_errors': 0
         }
         
-        # Load stats from database
-        self.load_stats()
-        
         # Real-time streaming
         self.stream_queue = queue.Queue(maxsize=100)
-        # SSE streaming removed - use polling or webhooks instead
+        # SSE streaming removed - dashboard updates are pushed over WebSocket
+        self.dashboard_broadcaster = DashboardBroadcaster(DASHBOARD_CLIENT_QUEUE_SIZE)
         
         # Shutdown flag
         self.running = True
+        self.stopped = False
+        self.stop_lock = threading.Lock()
         
     def setup_logging(self):
         """Setup rotating file logging"""
@@ -399,18 +679,85 @@ class PrinterAPIService:
         self.logger.addHandler(error_handler)
     
     def load_stats(self):
-        """Load statistics from database"""
+        """Load statistics and the recent-receipt cache from database"""
         recent = self.db_manager.get_recent_receipts(limit=MAX_MEMORY_RECEIPTS)
         if recent:
-            self.receipts = deque(recent, maxlen=MAX_MEMORY_RECEIPTS)
+            # Database returns newest first; cache oldest first like live receipts
+            for receipt in reversed(recent):
+                self.cache_receipt(receipt)
             # Count total from database
             with self.db_manager.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT COUNT(*) as count FROM receipts')
                 self.stats['total_received'] = cursor.fetchone()['count']
     
+    def new_receipt_id(self):
+        """Unique receipt id - a counter under a random per-process prefix, no uuid4 per receipt"""
+        return f"{next(self.id_counter):08x}{self.id_prefix}"
+    
+    def cache_receipt(self, receipt):
+        """Assign the next sequence number and add receipt to the memory cache"""
+        # Rows loaded from the database don't carry the derived preview
+        if 'preview' not in receipt:
+            receipt.update(self.receipt_extractor.extract_display_fields(receipt.get('plain_text', '')))
+        
+        with self.receipts_lock:
+            self.receipt_seq += 1
+            receipt['seq'] = self.receipt_seq
+            self.receipts.append(receipt)
+    
+    def get_receipt(self, receipt_id):
+        """Look up a receipt in the memory cache, falling back to the database"""
+        with self.receipts_lock:
+            for receipt in reversed(self.receipts):
+                if receipt['id'] == receipt_id:
+                    return receipt
+        return self.db_manager.get_receipt(receipt_id)
+    
+    def iter_receipts(self, batch_size=EXPORT_BATCH_SIZE):
+        """Cached receipts oldest first, copied out under the lock one batch at a time"""
+        last_seq = 0
+        while True:
+            with self.receipts_lock:
+                if not self.receipts:
+                    return
+                # seq is contiguous across the deque, so the next batch starts at a known offset
+                start = max(0, last_seq + 1 - self.receipts[0]['seq'])
+                batch = list(itertools.islice(self.receipts, start, start + batch_size))
+            if not batch:
+                return
+            yield from batch
+            last_seq = batch[-1]['seq']
+    
+    def get_receipts_since(self, since, limit=50):
+        """Cached receipts with seq > since, newest first (O(delta))"""
+        with self.receipts_lock:
+            # Sequence restarts with the process - a stale client gets a full resync
+            if since > self.receipt_seq:
+                since = 0
+            delta = []
+            for receipt in reversed(self.receipts):
+                if receipt['seq'] <= since or len(delta) >= limit:
+                    break
+                delta.append(receipt)
+            return delta
+    
     def start(self):
         """Start all services"""
+        # A worker re-forked from the preloaded master would otherwise reuse its id prefix
+        self.id_prefix = os.urandom(8).hex()
+        
+        # Load the cache and stats here, per worker - a snapshot taken in the master
+        # would miss everything earlier workers persisted
+        self.load_stats()
+        
+        # Parsing and sqlite calls leave the gevent hub from here on (worker process only)
+        use_gevent_threadpool()
+        
+        # The order processor only opens its clients and threads here, in the worker
+        if self.order_processor:
+            self.order_processor.start()
+        
         # Start Cloudflare retry queue
         self.cloudflare_queue.start()
         
@@ -430,12 +777,18 @@ class PrinterAPIService:
         print(f"🔄 Connection Pool: {MAX_CONCURRENT_CONNECTIONS} max")
     
     def stop(self):
-        """Gracefully stop all services"""
+        """Gracefully stop all services; later calls are no-ops"""
+        with self.stop_lock:
+            if self.stopped:
+                return
+            self.stopped = True
         self.running = False
+        # Let in-flight POS sessions finish handing receipts to the order processor
+        # before it stops, so its buffered dish rows go out in the final flush
+        self.executor.shutdown(wait=True)
         self.cloudflare_queue.stop()
         if self.order_processor:
             self.order_processor.stop()
-        self.executor.shutdown(wait=True, timeout=10)
         self.logger.info("Service stopped gracefully")
     
     def periodic_cleanup(self):
@@ -512,17 +865,19 @@ class PrinterAPIService:
         try:
             client_sock.settimeout(1.0)
             client_sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # Send status replies immediately - the POS waits on each one
+            client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
-            last_data_time = time.time()
+            last_data_time = time.monotonic()
             idle_timeout = 30.0
             
             while True:
                 try:
-                    data = client_sock.recv(1024)
+                    data = client_sock.recv(RECV_BUFFER_SIZE)
                     if not data:
                         break
                     
-                    last_data_time = time.time()
+                    last_data_time = time.monotonic()
                     session_data.append(data)
                     
                     # Send response
@@ -531,7 +886,7 @@ class PrinterAPIService:
                         client_sock.send(response)
                         
                 except socket.timeout:
-                    if time.time() - last_data_time > idle_timeout:
+                    if time.monotonic() - last_data_time > idle_timeout:
                         break
                     continue
                     
@@ -557,26 +912,23 @@ class PrinterAPIService:
             return  # Too small, probably just status query
         
         try:
-            # Parse ESC/POS
-            commands = self.escpos_parser.parse(complete_data)
-            plain_text = self.plain_renderer.render(commands)
-            
-            # Extract info
-            receipt_info = self.receipt_extractor.extract_receipt_info(plain_text)
+            # Parse ESC/POS and extract fields off the gevent hub
+            plain_text, receipt_info, display_fields = run_blocking(self.parse_receipt, complete_data)
             
             # Create receipt
             receipt = {
-                'id': str(uuid.uuid4()),
+                'id': self.new_receipt_id(),
                 'receipt_no': receipt_info['receipt_no'],
                 'timestamp': receipt_info['timestamp'],
                 'plain_text': plain_text
             }
+            receipt.update(display_fields)
             
             # Save to database
             self.db_manager.save_receipt(receipt, complete_data, source_ip)
             
             # Add to memory cache
-            self.receipts.append(receipt)
+            self.cache_receipt(receipt)
             
             # Update stats
             self.stats['total_received'] += 1
@@ -585,15 +937,10 @@ class PrinterAPIService:
             # Broadcast
             self.broadcast_receipt(receipt)
             
-            # Process to Supabase if enabled
+            # Process to Supabase if enabled - runs on the processor's pool so
+            # this connection slot is released without waiting on Supabase
             if self.order_processor:
-                try:
-                    result = self.order_processor.process_receipt(receipt)
-                    self.stats['supabase_processed'] += 1
-                    self.logger.info(f"✅ Supabase processed: {result}")
-                except Exception as e:
-                    self.stats['supabase_errors'] += 1
-                    self.logger.error(f"Supabase processing error: {e}")
+                self.order_processor.submit_receipt(order_receipt(receipt)).add_done_callback(self.on_order_processed)
             
             self.logger.info(f"✅ Receipt saved: {receipt['receipt_no'] or 'N/A'}")
             
@@ -601,39 +948,83 @@ class PrinterAPIService:
             self.logger.error(f"Parse error: {e}")
             self.stats['parse_errors'] += 1
     
+    def parse_receipt(self, complete_data):
+        """ESC/POS bytes to (plain_text, receipt_info, display_fields) - CPU-bound, safe on any thread"""
+        commands = ESCPOSParser().parse(complete_data)
+        plain_text = PlainTextRenderer().render(commands)
+        return (plain_text,
+                self.receipt_extractor.extract_receipt_info(plain_text),
+                self.receipt_extractor.extract_display_fields(plain_text))
+    
+    def on_order_processed(self, future):
+        """Record the outcome of a Supabase processing job"""
+        try:
+            result = future.result()
+            self.stats['supabase_processed'] += 1
+            self.logger.info(f"✅ Supabase processed: {result}")
+        except Exception as e:
+            self.stats['supabase_errors'] += 1
+            self.logger.error(f"Supabase processing error: {e}")
+    
     def get_response(self, data):
         """Generate proper ESC/POS response emulating a real thermal printer"""
         # DLE EOT n - Real-time status transmission
-        if b'\x10\x04\x01' in data:  # Printer status
-            # Status byte: 0x12 = Online, lid closed, no errors
-            # Bit 2: 0 = Lid closed, 1 = Lid open
-            # Bit 3: 0 = Online, 1 = Offline
-            # Bit 5: 0 = No error, 1 = Error
-            return b'\x12'  # Printer ready, lid closed
-        elif b'\x10\x04\x02' in data:  # Offline status
-            return b'\x12'  # Not offline
-        elif b'\x10\x04\x03' in data:  # Error status
-            return b'\x12'  # No errors
-        elif b'\x10\x04\x04' in data:  # Paper roll status
-            return b'\x12'  # Paper OK
-        elif b'\x10\x04' in data:  # General status query
+        pos = data.find(b'\x10\x04')
+        if pos != -1:
+            while pos != -1:
+                if data[pos + 2:pos + 3] in (b'\x01', b'\x02', b'\x03', b'\x04'):
+                    # n = 1..4 (printer / offline / error / paper roll status) all get the same byte
+                    # Status byte: 0x12 = Online, lid closed, no errors
+                    # Bit 2: 0 = Lid closed, 1 = Lid open
+                    # Bit 3: 0 = Online, 1 = Offline
+                    # Bit 5: 0 = No error, 1 = Error
+                    return b'\x12'  # Printer ready, lid closed, paper OK
+                pos = data.find(b'\x10\x04', pos + 2)
+            # General status query
             # Send all status bytes: printer OK, lid closed, paper present
             return b'\x10\x0F\x00\x00'  # All systems normal
-        elif b'\x1D\x49' in data:  # Get printer ID
+        if b'\x1D\x49' in data:  # Get printer ID
             return b'TM-T88V\x00'  # Emulate Epson TM-T88V
-        elif b'\x1B\x40' in data:  # Initialize printer
-            return b'\x06'  # ACK
-        elif b'\x1B\x64' in data:  # Feed n lines
+        # Initialize (ESC @), feed (ESC d), cut (GS V) and everything else get
+        # the same ACK, so there is no need to scan for each of them
+        if data:
             return b'\x06'  # ACK
-        elif b'\x1D\x56' in data:  # Cut paper
-            return b'\x06'  # ACK
-        elif len(data) > 0:
-            return b'\x06'  # General ACK
         return None
     
+    def get_health_snapshot(self):
+        """Health fields shared by /api/health and the dashboard push channel"""
+        uptime = (datetime.datetime.now() - self.stats['start_time']).total_seconds()
+        return {
+            'status': 'ok',
+            'version': '2.0',
+            'receipts_count': len(self.receipts),
+            'total_received': self.stats['total_received'],
+            'parse_errors': self.stats['parse_errors'],
+            'uptime_seconds': int(uptime),
+            'last_receipt': self.stats['last_receipt_time'],
+            'connection_pool': self.connection_pool.get_status()
+        }
+    
+    def get_live_stats(self):
+        """Lightweight stats for the dashboard push channel (no database queries)"""
+        return {
+            'total_receipts': self.stats['total_received'],
+            'connection_pool': self.connection_pool.get_status()
+        }
+    
+    def get_dashboard_snapshot(self, since=0, limit=50):
+        """Stats, health and new receipts for the dashboard in a single call"""
+        return {
+            'stats': self.get_live_stats(),
+            'health': self.get_health_snapshot(),
+            'recent': [summarize_receipt(r) for r in self.get_receipts_since(since, limit=limit)]
+        }
+    
     def broadcast_receipt(self, receipt):
-        """SSE broadcasting removed - data available via polling /api/receipts"""
-        pass  # Keep method for backward compatibility, but it's a no-op now
+        """Push a new receipt and the updated counters to dashboard clients"""
+        self.dashboard_broadcaster.publish({'type': 'receipt', 'receipt': summarize_receipt(receipt)})
+        self.dashboard_broadcaster.publish({'type': 'stats', **self.get_live_stats()})
+        self.dashboard_broadcaster.publish({'type': 'health', **self.get_health_snapshot()})
 
 # Initialize service
 service = PrinterAPIService()
@@ -642,39 +1033,102 @@ service = PrinterAPIService()
 @app.route('/')
 def index():
     """Web dashboard for monitoring"""
-    return get_dashboard_html()
+    if dashboard_not_modified(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=get_dashboard_not_modified_headers())
+    body, headers = get_dashboard_bytes(request.headers.get('Accept-Encoding', ''))
+    return Response(body, headers=headers)
+
+@app.route('/api/login', methods=['POST'])
+@limiter.limit("10 per minute")
+def login():
+    """Exchange the API password for an HttpOnly session cookie"""
+    data = request.get_json(silent=True) or {}
+    if not is_valid_password(data.get('password')):
+        service.logger.warning(f"Failed login attempt from {get_remote_address()}")
+        return jsonify({'error': 'Invalid password'}), 403
+    
+    response = jsonify({'status': 'ok'})
+    response.set_cookie(
+        SESSION_COOKIE,
+        sessions.create(),
+        max_age=SESSION_TTL,
+        httponly=True,
+        # Cloudflare tunnel terminates TLS, so also trust the forwarded scheme
+        secure=request.is_secure or request.headers.get('X-Forwarded-Proto') == 'https',
+        samesite='Strict'
+    )
+    return response
+
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    """End the dashboard session"""
+    sessions.revoke(request.cookies.get(SESSION_COOKIE))
+    response = jsonify({'status': 'ok'})
+    response.delete_cookie(SESSION_COOKIE)
+    return response
+
+@app.route('/assets/<filename>')
+def dashboard_asset(filename):
+    """Content-hashed dashboard CSS/JS, cached by browsers for a year"""
+    asset = get_static_asset(filename, request.headers.get('Accept-Encoding', ''))
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    body, headers = asset
+    return Response(body, headers=headers)
 
 @app.route('/api/health', methods=['GET'])
 @require_auth
 def health_check():
     """Enhanced health check with connection pool status"""
-    uptime = (datetime.datetime.now() - service.stats['start_time']).total_seconds()
-    pool_status = service.connection_pool.get_status()
-    
-    return jsonify({
-        'status': 'ok',
-        'version': '2.0',
-        'receipts_count': len(service.receipts),
-        'total_received': service.stats['total_received'],
-        'parse_errors': service.stats['parse_errors'],
-        'uptime_seconds': int(uptime),
-        'last_receipt': service.stats['last_receipt_time'],
-        'connection_pool': pool_status
-    })
+    return jsonify(service.get_health_snapshot())
 
 @app.route('/api/recent', methods=['GET'])
 @require_auth
 def get_recent():
-    """Get recent receipts from database"""
+    """Get recent receipts from database, or only new ones with ?since=<seq>
+
+    plain_text is left out unless ?full=1 - /api/receipt/<id> serves the full text.
+    """
     limit = request.args.get('limit', 10, type=int)
-    recent = service.db_manager.get_recent_receipts(limit=min(limit, 100))
+    since = request.args.get('since', type=int)
+    if since is not None:
+        recent = service.get_receipts_since(since, limit=min(limit, 100))
+    else:
+        recent = service.db_manager.get_recent_receipts(limit=min(limit, 100))
+    if request.args.get('full') != '1':
+        recent = [summarize_receipt(receipt) for receipt in recent]
     return jsonify(recent)
 
 @app.route('/api/receipts', methods=['GET'])
 @require_auth
 def get_all_receipts():
-    """Get all cached receipts"""
-    return jsonify(list(service.receipts))
+    """Get all cached receipts (?format=ndjson streams them as a file download)"""
+    if request.args.get('format') == 'ndjson':
+        # One line per receipt, serialized as it is sent - the dashboard export
+        # downloads this straight to disk
+        def generate():
+            for receipt in service.iter_receipts():
+                yield json.dumps(receipt, ensure_ascii=False) + '\n'
+        
+        filename = f"receipts_{datetime.date.today().isoformat()}.ndjson"
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    
+    with service.receipts_lock:
+        receipts = list(service.receipts)
+    return jsonify(receipts)
+
+@app.route('/api/receipt/<receipt_id>', methods=['GET'])
+@require_auth
+def get_receipt(receipt_id):
+    """Get a single receipt including plain_text (dashboard detail view)"""
+    receipt = service.get_receipt(receipt_id)
+    if receipt is None:
+        return jsonify({'error': 'Receipt not found'}), 404
+    return jsonify(receipt)
 
 @app.route('/api/search', methods=['GET'])
 @require_auth
@@ -685,48 +1139,28 @@ def search_receipts():
     if not receipt_no:
         return jsonify({'error': 'Please provide receipt number'}), 400
     
-    with service.db_manager.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, receipt_no, timestamp, plain_text, created_at
-            FROM receipts
-            WHERE receipt_no = ?
-            ORDER BY created_at DESC
-            LIMIT 10
-        ''', (receipt_no,))
-        results = [dict(row) for row in cursor.fetchall()]
-    
-    return jsonify(results)
+    return jsonify(service.db_manager.search_receipts(receipt_no))
+
+@app.route('/api/dashboard-snapshot', methods=['GET'])
+@require_auth
+def get_dashboard_snapshot():
+    """Everything the dashboard shows in one request (use ?since=<seq> for deltas)"""
+    limit = request.args.get('limit', 50, type=int)
+    since = request.args.get('since', 0, type=int)
+    return jsonify(service.get_dashboard_snapshot(since, limit=min(limit, 100)))
 
 @app.route('/api/stats', methods=['GET'])
 @require_auth
 def get_stats():
     """Get detailed statistics"""
-    with service.db_manager.get_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Total receipts
-        cursor.execute('SELECT COUNT(*) as total FROM receipts')
-        total = cursor.fetchone()['total']
-        
-        # Today's receipts
-        cursor.execute('''
-            SELECT COUNT(*) as today 
-            FROM receipts 
-            WHERE date(created_at) = date('now')
-        ''')
-        today = cursor.fetchone()['today']
-        
-        # Unsynced receipts
-        cursor.execute('SELECT COUNT(*) as unsynced FROM receipts WHERE synced_to_cloudflare = 0')
-        unsynced = cursor.fetchone()['unsynced']
+    counts = service.db_manager.get_counts()
     
     pool_status = service.connection_pool.get_status()
     
     return jsonify({
-        'total_receipts': total,
-        'today_receipts': today,
-        'unsynced_receipts': unsynced,
+        'total_receipts': counts['total'],
+        'today_receipts': counts['today'],
+        'unsynced_receipts': counts['unsynced'],
         'parse_errors': service.stats['parse_errors'],
         'supabase_processed': service.stats.get('supabase_processed', 0),
         'supabase_errors': service.stats.get('supabase_errors', 0),
@@ -735,19 +1169,51 @@ def get_stats():
         'memory_cache_size': len(service.receipts)
     })
 
-# SSE endpoint removed - using polling or webhooks instead
+# SSE endpoint removed - the dashboard uses the WebSocket channel below,
+# with the REST endpoints above as a fallback
 # The SSE endpoint was causing thread exhaustion and performance issues
 
+if WEBSOCKET_ENABLED:
+    sock = Sock(app)
+    
+    @sock.route('/ws/dashboard')
+    def dashboard_socket(ws):
+        """Push receipts, stats and health to the dashboard as they change"""
+        if not (sessions.is_valid(request.cookies.get(SESSION_COOKIE))
+                or is_valid_password(request.args.get('auth'))):
+            service.logger.warning(f"Failed websocket auth attempt from {get_remote_address()}")
+            ws.close(reason=1008, message='Invalid password')
+            return
+        
+        client_queue = service.dashboard_broadcaster.subscribe()
+        try:
+            # Initial snapshot so the client doesn't need to poll
+            ws.send(json.dumps({'type': 'stats', **service.get_live_stats()}))
+            ws.send(json.dumps({'type': 'health', **service.get_health_snapshot()}))
+            
+            while True:
+                try:
+                    message = client_queue.get(timeout=DASHBOARD_PING_INTERVAL)
+                except queue.Empty:
+                    message = '{"type": "ping"}'  # Keepalive, also detects dead sockets
+                ws.send(message)
+        except ConnectionClosed:
+            pass  # Normal disconnect
+        finally:
+            service.dashboard_broadcaster.unsubscribe(client_queue)
+
 # Signal handlers for graceful shutdown
 def signal_handler(signum, frame):
     print("\\n🛑 Shutting down gracefully...")
     service.stop()
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
-
 if __name__ == "__main__":
+    # Standalone only - under gunicorn the worker installs its own handlers and
+    # the worker_exit hook stops the service
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    
     # Start services
     service.start()
     
@@ -0,0 +1,373 @@
+// Auth is an HttpOnly session cookie - the password never touches JS-readable storage
+localStorage.removeItem('apiPassword');  // Purge passwords saved by older versions
+let isAuthenticated = false;
+let lastSeenSeq = 0;
+const renderedIds = new Set();
+const RECEIPT_ROW_TPL = document.getElementById('receipt-row-tpl').content.firstElementChild;
+let liveSocket = null;
+let reconnectTimer = null;
+let reconnectDelay = 1000;
+let uptimeBase = 0;
+let uptimeReceivedAt = Date.now();
+let uptimeTimer = null;
+let inflightRefresh = null;
+let pollTimer = null;
+const REFRESH_TIMEOUT_MS = 10000;
+const POLL_INTERVAL_MS = 5000;  // REST polling while the push channel isn't open
+
+function applyStats(data) {
+    document.getElementById('total-receipts').textContent = data.total_receipts || 0;
+    document.getElementById('active-connections').textContent = data.connection_pool?.active || 0;
+    document.getElementById('connection-status').textContent = `of ${data.connection_pool?.max || 50} max`;
+}
+
+function renderUptime() {
+    const uptime = uptimeBase + Math.floor((Date.now() - uptimeReceivedAt) / 1000);
+    const hours = Math.floor(uptime / 3600);
+    const minutes = Math.floor((uptime % 3600) / 60);
+    document.getElementById('uptime').textContent = `Uptime: ${hours}h ${minutes}m`;
+}
+
+function startUptimeTimer() {
+    // One ticker at most, and none while the tab is hidden
+    if (!uptimeTimer && !document.hidden) {
+        uptimeTimer = setInterval(renderUptime, 60000);
+    }
+}
+
+function stopUptimeTimer() {
+    if (uptimeTimer) {
+        clearInterval(uptimeTimer);
+        uptimeTimer = null;
+    }
+}
+
+function applyHealth(health) {
+    // Uptime keeps ticking locally between pushes
+    uptimeBase = health.uptime_seconds || 0;
+    uptimeReceivedAt = Date.now();
+    renderUptime();
+    startUptimeTimer();
+
+    if (health.last_receipt) {
+        const lastTime = new Date(health.last_receipt);
+        document.getElementById('last-receipt-time').textContent = lastTime.toLocaleString();
+    }
+}
+
+function refresh() {
+    // Coalesce overlapping calls onto the request already in flight
+    if (inflightRefresh) return inflightRefresh;
+
+    // A stalled request must not hold the guard forever - abort it after a timeout
+    const controller = new AbortController();
+    const abortTimer = setTimeout(() => controller.abort(), REFRESH_TIMEOUT_MS);
+
+    // Stats, health and new receipts in one round trip
+    const since = lastSeenSeq;
+    inflightRefresh = fetch(`/api/dashboard-snapshot?limit=50&since=${since}`, {
+        credentials: 'same-origin',
+        signal: controller.signal
+    })
+        .then(async res => {
+            if (!res.ok) {
+                showAuthPrompt();
+                return;
+            }
+            const data = await res.json();
+            applyStats(data.stats);
+            applyHealth(data.health);
+
+            // Newest first. Rows at or below `since` mean the server restarted and
+            // sent a full resync with a fresh sequence - start the list over
+            if (data.recent.length) {
+                if (since && data.recent[0].seq <= since) {
+                    clearReceipts();
+                    lastSeenSeq = data.recent[0].seq;
+                } else {
+                    lastSeenSeq = Math.max(lastSeenSeq, data.recent[0].seq);
+                }
+            }
+            insertReceipts(data.recent);
+        })
+        .catch(error => console.error('Failed to refresh:', error))
+        .finally(() => {
+            clearTimeout(abortTimer);
+            inflightRefresh = null;
+        });
+    return inflightRefresh;
+}
+
+function addReceipt(receipt) {
+    lastSeenSeq = Math.max(lastSeenSeq, receipt.seq || 0);
+    insertReceipts([receipt]);
+}
+
+function clearReceipts() {
+    renderedIds.clear();
+    document.getElementById('receipts-container').replaceChildren();
+}
+
+function insertReceipts(receiptList) {
+    // Only unseen receipts touch the DOM; the list stays ordered by seq, newest on top,
+    // even when a refresh response lands after rows pushed while it was in flight
+    const container = document.getElementById('receipts-container');
+    const fresh = receiptList
+        .filter(receipt => !renderedIds.has(receipt.id))
+        .sort((a, b) => b.seq - a.seq);
+    if (!fresh.length) return;
+    const highlight = renderedIds.size > 0;  // Don't flash the initial load
+
+    // Build off-document, then insert in one write per frame
+    const items = fresh.map(receipt => {
+        renderedIds.add(receipt.id);
+        return buildReceiptItem(receipt, highlight);
+    });
+
+    requestAnimationFrame(() => {
+        const top = container.firstElementChild;
+        if (!top || Number(top.dataset.seq) < fresh[fresh.length - 1].seq) {
+            // Usual case: everything is newer than the top row - one prepend
+            const frag = document.createDocumentFragment();
+            items.forEach(item => frag.appendChild(item));
+            container.prepend(frag);
+        } else {
+            items.forEach(item => {
+                let next = container.firstElementChild;
+                while (next && Number(next.dataset.seq) > Number(item.dataset.seq)) {
+                    next = next.nextElementSibling;
+                }
+                container.insertBefore(item, next);
+            });
+        }
+
+        // Evict the tail so the list stays at 50 items
+        while (container.childElementCount > 50) {
+            renderedIds.delete(container.lastChild.dataset.id);
+            container.lastChild.remove();
+        }
+    });
+}
+
+function buildReceiptItem(receipt, isNew = false) {
+    const item = RECEIPT_ROW_TPL.cloneNode(true);
+    item.dataset.id = receipt.id;
+    item.dataset.seq = receipt.seq;
+
+    // Highlight new receipts (CSS animation runs once on insert)
+    if (isNew) {
+        item.classList.add('new-receipt');
+    }
+
+    // textContent skips the HTML parser and escapes receipt text
+    item.querySelector('.receipt-no').textContent = `Receipt #${receipt.receipt_no || 'N/A'}`;
+    item.querySelector('.receipt-time').textContent = new Date(receipt.timestamp).toLocaleString();
+    item.querySelector('.receipt-preview').textContent = `${receipt.preview || '[Empty Receipt]'}...`;
+
+    // Add click handler
+    item.onclick = () => showOrderDetails(receipt);
+
+    return item;
+}
+
+function infoRow(label, value) {
+    const row = document.createElement('div');
+    row.className = 'order-info-row';
+    const labelSpan = document.createElement('span');
+    labelSpan.className = 'order-info-label';
+    labelSpan.textContent = label;
+    const valueSpan = document.createElement('span');
+    valueSpan.textContent = value;
+    row.append(labelSpan, valueSpan);
+    return row;
+}
+
+async function showOrderDetails(receipt) {
+    const modal = document.getElementById('order-modal');
+    const infoDiv = document.getElementById('order-info');
+    const contentDiv = document.getElementById('order-content');
+
+    // Table number and order type are parsed server-side at ingest
+    const tableNo = receipt.table_no || 'N/A';
+    const orderType = receipt.order_type || 'Receipt';
+
+    // Display order info - values come from raw POS text, so they only ever go in textContent
+    const rows = [
+        infoRow('Receipt Number:', receipt.receipt_no || 'N/A'),
+        infoRow('Order Type:', orderType),
+        infoRow('Table:', tableNo),
+        infoRow('Time:', new Date(receipt.timestamp).toLocaleString())
+    ];
+    if (receipt.supabase_status) {
+        const status = infoRow('Supabase Status:', receipt.supabase_status.toUpperCase());
+        status.lastChild.style.color = receipt.supabase_status === 'processed' ? '#48bb78' : '#f56565';
+        rows.push(status);
+    }
+    infoDiv.replaceChildren(...rows);
+
+    // Show modal, then load the full receipt text (list views don't carry it)
+    contentDiv.textContent = 'Loading...';
+    modal.classList.add('show');
+
+    try {
+        const res = await fetch(`/api/receipt/${encodeURIComponent(receipt.id)}`, {
+            credentials: 'same-origin'
+        });
+        if (!res.ok) {
+            contentDiv.textContent = 'No content available';
+            return;
+        }
+        const detail = await res.json();
+        contentDiv.textContent = detail.plain_text || 'No content available';
+    } catch (error) {
+        console.error('Failed to load receipt:', error);
+        contentDiv.textContent = 'No content available';
+    }
+}
+
+function closeOrderModal() {
+    document.getElementById('order-modal').classList.remove('show');
+}
+
+async function exportReceipts() {
+    try {
+        // Check the session first - an expired one would download an error body
+        const res = await fetch('/api/health', {
+            credentials: 'same-origin'
+        });
+        if (!res.ok) {
+            showAuthPrompt();
+            return;
+        }
+        // The browser streams the NDJSON export straight to disk; no Blob held in the page
+        const a = document.createElement('a');
+        a.href = '/api/receipts?format=ndjson';
+        a.download = `receipts_${new Date().toISOString().split('T')[0]}.ndjson`;
+        a.click();
+    } catch (error) {
+        console.error('Export failed:', error);
+    }
+}
+
+function showAuthPrompt() {
+    document.getElementById('auth-modal').classList.add('show');
+    document.getElementById('auth-password').focus();
+}
+
+async function authenticate() {
+    const password = document.getElementById('auth-password').value;
+    if (!password) return;
+
+    try {
+        const res = await fetch('/api/login', {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ password })
+        });
+
+        if (res.ok) {
+            isAuthenticated = true;
+            document.getElementById('auth-password').value = '';
+            document.getElementById('auth-modal').classList.remove('show');
+            document.getElementById('auth-error').style.display = 'none';
+
+            startLiveUpdates();
+        } else {
+            document.getElementById('auth-error').style.display = 'block';
+            document.getElementById('auth-password').value = '';
+        }
+    } catch (error) {
+        console.error('Auth error:', error);
+        document.getElementById('auth-error').style.display = 'block';
+    }
+}
+
+function startLiveUpdates() {
+    connectLiveSocket();
+    // Poll over REST whenever the socket isn't open (reconnecting, or no WebSocket support)
+    if (!pollTimer) {
+        pollTimer = setInterval(() => {
+            if (document.hidden) return;
+            if (!liveSocket || liveSocket.readyState !== WebSocket.OPEN) {
+                refresh();
+            }
+        }, POLL_INTERVAL_MS);
+    }
+}
+
+function connectLiveSocket() {
+    // Drop any existing socket/retry before opening a new one
+    if (reconnectTimer) {
+        clearTimeout(reconnectTimer);
+        reconnectTimer = null;
+    }
+    if (liveSocket) {
+        liveSocket.onclose = null;
+        liveSocket.close();
+    }
+
+    const protocol = location.protocol === 'https:' ? 'wss://' : 'ws://';
+    // The session cookie is sent with the handshake
+    liveSocket = new WebSocket(protocol + location.host + '/ws/dashboard');
+
+    liveSocket.onopen = () => {
+        reconnectDelay = 1000;
+        // Stats and health arrive as the first pushes; the list is synced once over REST
+        refresh();
+    };
+
+    liveSocket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'receipt') {
+            addReceipt(message.receipt);
+        } else if (message.type === 'stats') {
+            applyStats(message);
+        } else if (message.type === 'health') {
+            applyHealth(message);
+        }
+    };
+
+    liveSocket.onclose = () => {
+        liveSocket = null;
+        // The poll timer keeps the list current while down; catch up now, then retry with backoff
+        refresh();
+        reconnectTimer = setTimeout(connectLiveSocket, reconnectDelay);
+        reconnectDelay = Math.min(reconnectDelay * 2, 60000);
+    };
+}
+
+// Initialize - an existing session cookie skips the login prompt
+fetch('/api/health', { credentials: 'same-origin' })
+    .then(res => {
+        if (res.ok) {
+            isAuthenticated = true;
+            startLiveUpdates();
+        } else {
+            showAuthPrompt();
+        }
+    })
+    .catch(() => showAuthPrompt());
+
+// Pause animations and the uptime ticker while the tab is hidden
+document.addEventListener('visibilitychange', () => {
+    if (document.hidden) {
+        document.body.classList.add('paused');
+        stopUptimeTimer();
+    } else {
+        document.body.classList.remove('paused');
+        if (isAuthenticated) {
+            renderUptime();
+            stopUptimeTimer();
+            startUptimeTimer();
+            refresh();  // Catch up in case the push channel dropped while hidden
+        }
+    }
+});
+
+// Close modal on ESC key
+document.addEventListener('keydown', (e) => {
+    if (e.key === 'Escape') {
+        closeOrderModal();
+    }
+});
@@ -0,0 +1,27 @@
+-- Insert a customer order and its dishes in one transaction / one PostgREST call.
+-- Called from order_processor.OrderProcessor.create_order via supabase.rpc().
+create or replace function public.create_order_with_dishes(p_order jsonb, p_dishes jsonb)
+returns uuid
+language plpgsql
+as $$
+declare
+    v_order_id uuid;
+begin
+    insert into order_orders (restaurant_id, receipt_no, table_no, order_type, status, raw_data, ordered_at, source)
+    select restaurant_id, receipt_no, table_no, order_type, status, raw_data, ordered_at, source
+    from jsonb_populate_record(null::order_orders, p_order)
+    returning id into v_order_id;
+
+    insert into order_dishes (order_id, restaurant_id, receipt_no, name, quantity, station_id,
+                              table_no, status, prep_time_minutes, urgency_level)
+    select v_order_id, restaurant_id, receipt_no, name, quantity, station_id,
+           table_no, status, prep_time_minutes, urgency_level
+    from jsonb_populate_recordset(null::order_dishes, coalesce(p_dishes, '[]'::jsonb));
+
+    return v_order_id;
+end;
+$$;
+
+-- Only the service role (used by the printer API) may call it
+revoke execute on function public.create_order_with_dishes(jsonb, jsonb) from public, anon, authenticated;
+grant execute on function public.create_order_with_dishes(jsonb, jsonb) to service_role;
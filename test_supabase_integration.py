@@ -41,6 +41,7 @@ def test_integration():
     # Initialize processor
     try:
         processor = OrderProcessor()
+        processor.start()
         print("✅ OrderProcessor initialized")
     except Exception as e:
         print(f"❌ Failed to initialize OrderProcessor: {e}")
@@ -0,0 +1,22 @@
+"""Dashboard revalidation (If-None-Match) against its content-hash ETag"""
+import pytest
+
+import dashboard
+
+ETAG = dashboard._DASHBOARD_ETAG
+
+
+@pytest.mark.parametrize('if_none_match, expected', [
+    (ETAG, True),
+    (f' {ETAG} ', True),
+    (f'W/{ETAG}', True),  # Weak comparison, e.g. after a proxy re-encodes the body
+    (f'"stale", {ETAG}', True),
+    (f'"stale",W/{ETAG}', True),
+    ('*', True),
+    ('"stale"', False),
+    (ETAG.strip('"'), False),  # Unquoted
+    ('', False),
+    (None, False),
+])
+def test_should_match_if_none_match_against_the_dashboard_etag(if_none_match, expected):
+    assert dashboard.dashboard_not_modified(if_none_match) is expected
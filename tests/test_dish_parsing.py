@@ -0,0 +1,119 @@
+"""Dish extraction from receipt text - expected values are what the original parsers returned"""
+import pytest
+
+from order_processor import _parse_customer_dishes, _parse_kitchen_slip_dishes
+
+CUSTOMER_ORDER = (
+    '桌号: 8\n菜品单价数量小计\n'
+    '野菜卷181份18\n木姜子鲜黄牛肉521份52\n-少辣\n米饭22碗4\n菜品价格合计: 74'
+)
+
+KITCHEN_SLIP = (
+    '制作分单\n档口: 荤菜\n桌号: 8\n菜品数量\n'
+    '木姜子鲜黄牛肉1/份\n(退)酸汤肥牛2/份\n-加辣\n紫苏半边云（鲜牛1/份\n胸口）\n单号: T2'
+)
+
+
+def customer_dishes(dish_lines):
+    """Parse dish_lines as the body of a customer order"""
+    return list(_parse_customer_dishes(f'菜品单价数量小计\n{dish_lines}\n'))
+
+
+def kitchen_dishes(dish_lines):
+    """Parse dish_lines as the body of a kitchen slip"""
+    return list(_parse_kitchen_slip_dishes(f'制作分单\n菜品数量\n{dish_lines}\n单号: T1'))
+
+
+def test_should_parse_a_full_customer_order():
+    assert list(_parse_customer_dishes(CUSTOMER_ORDER)) == [
+        ('野菜卷', 1),
+        ('木姜子鲜黄牛肉', 1),
+        ('米饭', 2),
+    ]
+
+
+@pytest.mark.parametrize('dish_lines, expected', [
+    # name + price + quantity + unit + subtotal, for every unit
+    ('野菜卷181份18', [('野菜卷', 1)]),
+    ('可乐51瓶5', [('可乐', 1)]),
+    ('雪碧32听6', [('雪碧', 2)]),
+    ('鸡翅152盒30', [('鸡翅', 2)]),
+    ('茶位21位2', [('茶位', 1)]),
+    ('豆浆51杯5', [('豆浆', 1)]),
+    ('米饭22碗4', [('米饭', 2)]),
+    ('饺子101个10', [('饺子', 1)]),
+    ('饼121张12', [('饼', 1)]),
+    ('紫苏半边云（鲜牛胸口）381份38', [('紫苏半边云（鲜牛胸口）', 1)]),
+    # Digits next to the price belong to the price, never the name
+    ('木姜子鲜黄牛肉521份52', [('木姜子鲜黄牛肉', 1)]),
+    ('羊肉串101份10', [('羊肉串', 1)]),
+    ('套餐2381份38', [('套餐', 1)]),
+    ('A套餐1282份56', [('A套餐', 2)]),
+    # Digits elsewhere in the name are kept
+    ('小菜2号122份24', [('小菜2号', 2)]),
+    ('A2号181份18', [('A2号', 1)]),
+    ('4季豆121份12', [('4季豆', 1)]),
+    ('可乐330ml51瓶5', [('可乐330ml', 1)]),
+    # Modifier lines
+    ('-少冰', []),
+    ('- 加辣', []),
+    ('野菜卷181份18\n-少辣\n米饭22碗4', [('野菜卷', 1), ('米饭', 2)]),
+    # Fallback: a name followed by a bare number counts once
+    ('手撕包菜28', [('手撕包菜', 1)]),
+    ('豆腐2 ', [('豆腐', 1)]),
+    ('菜 10', [('菜', 1)]),
+    ('鸭血 120份0', []),  # Zero quantity
+    ('1234份5', []),  # No name
+    ('88', []),
+    ('3号桌菜', []),
+    ('鸡蛋汤', []),
+])
+def test_should_parse_customer_dish_lines_like_the_original_parser(dish_lines, expected):
+    assert customer_dishes(dish_lines) == expected
+
+
+def test_should_parse_a_full_kitchen_slip():
+    assert list(_parse_kitchen_slip_dishes(KITCHEN_SLIP)) == [
+        ('木姜子鲜黄牛肉', 1),
+        ('酸汤肥牛', 2),
+        ('紫苏半边云（鲜牛胸口）', 1),
+    ]
+
+
+@pytest.mark.parametrize('dish_lines, expected', [
+    # Every unit the quantity can carry
+    ('啤酒12/瓶', [('啤酒', 12)]),
+    ('可乐2/听', [('可乐', 2)]),
+    ('果盘1/盒', [('果盘', 1)]),
+    ('豆腐10/个加急', [('豆腐', 10)]),  # Text after the unit is dropped
+    ('木姜子鲜黄牛肉1/份', [('木姜子鲜黄牛肉', 1)]),
+    # Names with digits in them
+    ('1号菜2/份', [('1号菜', 2)]),
+    ('A1/份', []),  # One-character names are dropped
+    # Modifier lines, even when indented or carrying a quantity
+    ('-加辣', []),
+    ('  - 加辣2/份', []),
+    ('牛肉3/份\n-少辣\n鱼丸2/份', [('牛肉', 3), ('鱼丸', 2)]),
+    # Returned dishes and indentation
+    ('(退)酸汤肥牛2/份', [('酸汤肥牛', 2)]),
+    (' (退)鱼丸2/份', [('鱼丸', 2)]),
+    ('\t牛肉3/份', [('牛肉', 3)]),
+    # Names wrapped onto a second line
+    ('紫苏半边云（鲜牛1/份\n胸口）', [('紫苏半边云（鲜牛胸口）', 1)]),
+    ('(退)酸汤（大2/份\n份）', [('酸汤（大份）', 2)]),
+    ('鸭（大1/份\n加辣2/份）', [('鸭（大', 1), ('加辣', 2)]),  # Next line is its own dish
+    ('酸汤（大\n份）2/份', [('份）', 2)]),
+    ('清炒时蔬（大份）1/份', [('清炒时蔬（大份）', 1)]),
+])
+def test_should_parse_kitchen_dish_lines_like_the_line_by_line_parser(dish_lines, expected):
+    assert kitchen_dishes(dish_lines) == expected
+
+
+def test_should_return_nothing_without_a_customer_dish_section():
+    assert _parse_customer_dishes('') == ()
+    assert _parse_customer_dishes('桌号: 8\n合计: 74') == ()
+
+
+def test_should_return_nothing_without_a_kitchen_dish_section():
+    assert _parse_kitchen_slip_dishes('') == ()
+    assert _parse_kitchen_slip_dishes('桌号: 8\n菜品单价数量小计\n野菜卷181份18\n') == ()
@@ -0,0 +1,36 @@
+"""Buffered dish rows are flushed when the processor stops, exactly once"""
+from unittest import mock
+
+import pytest
+
+from order_processor import OrderProcessor
+
+
+@pytest.fixture(autouse=True)
+def no_supabase(monkeypatch):
+    """Build processors without credentials so no client is created"""
+    for name in ('SUPABASE_URL', 'SUPABASE_SERVICE_ROLE_KEY', 'SUPABASE_DB_URL', 'AXIOM_TOKEN'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def processor_with_buffered_dishes():
+    processor = OrderProcessor()
+    processor.supabase = mock.Mock()
+    processor.queue_dishes([{'receipt_no': 'T1', 'dish_name': '野菜卷', 'quantity': 1}])
+    return processor
+
+
+def test_should_flush_buffered_dishes_on_stop():
+    processor = processor_with_buffered_dishes()
+    with mock.patch.object(OrderProcessor, 'flush_dishes', return_value=True) as flush:
+        processor.stop()
+    flush.assert_called_once_with()
+
+
+def test_should_only_stop_once():
+    processor = processor_with_buffered_dishes()
+    with mock.patch.object(OrderProcessor, 'flush_dishes', return_value=True) as flush:
+        processor.stop()
+        processor.stop()
+    assert flush.call_count == 1
+    assert processor.supabase.postgrest.session.close.call_count == 1
@@ -0,0 +1,55 @@
+"""Supabase table numbers come from OrderProcessor's parser, not the dashboard display fields"""
+from unittest import mock
+
+import pytest
+
+import printer_api_service_v2
+from order_processor import OrderProcessor
+from printer_api_service_v2 import service
+
+SESSION_DATA = [b'\x1b\x40' + b'x' * 64]  # Long enough to count as a print job (rendering is stubbed)
+
+
+def submitted_receipt(plain_text):
+    """Run one print session through process_receipt_data; return what reached the order processor"""
+    order_processor = mock.Mock()
+    with mock.patch.object(printer_api_service_v2, 'ESCPOSParser'), \
+         mock.patch.object(printer_api_service_v2, 'PlainTextRenderer') as renderer, \
+         mock.patch.object(service, 'db_manager'), \
+         mock.patch.object(service, 'cache_receipt'), \
+         mock.patch.object(service, 'broadcast_receipt'), \
+         mock.patch.object(service, 'order_processor', order_processor):
+        renderer.return_value.render.return_value = plain_text
+        service.process_receipt_data(SESSION_DATA, '127.0.0.1')
+    return order_processor.submit_receipt.call_args.args[0]
+
+
+def supabase_table_no(receipt):
+    """Table number OrderProcessor.process_receipt would write to Supabase for receipt"""
+    processor = OrderProcessor()
+    with mock.patch.object(OrderProcessor, 'process_customer_order', return_value={}) as customer_order:
+        processor.process_receipt(receipt, retry=False)
+    return customer_order.call_args.args[2]
+
+
+@pytest.fixture(autouse=True)
+def no_supabase(monkeypatch):
+    """Build processors without credentials so no client is created"""
+    for name in ('SUPABASE_URL', 'SUPABASE_SERVICE_ROLE_KEY', 'SUPABASE_DB_URL', 'AXIOM_TOKEN'):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.mark.parametrize('plain_text, expected', [
+    ('桌号: 8\n菜品单价数量小计\n野菜卷181份18\n', '8'),
+    ('菜品单价数量小计\n野菜卷181份18\n', '未知'),
+    ('台号: 12\n菜品单价数量小计\n野菜卷181份18\n', '未知'),  # Display fields also accept 台号
+    ('桌号: 3\n菜品单价数量小计\n野菜卷181份18\n桌号: 5\n', '3'),  # Display fields keep the last match
+])
+def test_should_keep_processor_table_number_for_supabase(plain_text, expected):
+    """The dashboard's table_no never overrides the processor's parsing"""
+    assert supabase_table_no(submitted_receipt(plain_text)) == expected
+
+
+def test_should_leave_display_fields_out_of_the_order_receipt():
+    receipt = submitted_receipt('桌号: 8\n菜品单价数量小计\n野菜卷181份18\n')
+    assert not set(printer_api_service_v2.DISPLAY_FIELDS) & set(receipt)
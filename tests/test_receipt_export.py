@@ -0,0 +1,39 @@
+"""Streaming export of the receipt cache"""
+from collections import deque
+from unittest import mock
+
+import pytest
+
+from printer_api_service_v2 import service
+
+
+@pytest.fixture
+def receipts():
+    """An empty receipt cache holding at most five receipts"""
+    with mock.patch.object(service, 'receipts', deque(maxlen=5)), \
+         mock.patch.object(service, 'receipt_seq', 0):
+        yield service.receipts
+
+
+def cache(first, last):
+    for n in range(first, last + 1):
+        service.cache_receipt({'id': f'r{n}', 'plain_text': f'单号: {n}'})
+
+
+def test_should_export_every_cached_receipt_oldest_first(receipts):
+    cache(0, 4)
+    assert [r['id'] for r in service.iter_receipts(batch_size=2)] == ['r0', 'r1', 'r2', 'r3', 'r4']
+
+
+def test_should_export_nothing_from_an_empty_cache(receipts):
+    assert list(service.iter_receipts()) == []
+
+
+def test_should_continue_after_evictions_between_batches(receipts):
+    cache(0, 4)
+    exported = service.iter_receipts(batch_size=2)
+    first_batch = [next(exported)['id'], next(exported)['id']]
+    cache(5, 7)  # Evicts r0-r2 while the export is paused between batches
+    rest = [r['id'] for r in exported]
+    assert first_batch == ['r0', 'r1']
+    assert rest == ['r3', 'r4', 'r5', 'r6', 'r7']
@@ -0,0 +1,124 @@
+"""单号/时间 extraction - expected values are what the original line-by-line extractors returned"""
+import time
+
+import pytest
+
+import printer_api_service
+import printer_api_service_v2
+
+FIXED_NOW = time.mktime((2026, 1, 2, 3, 4, 5, 0, 0, -1))
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    """Pin time.time() and drop any cached timestamp string"""
+    monkeypatch.setattr(time, 'time', lambda: FIXED_NOW)
+    monkeypatch.setattr(printer_api_service, '_timestamp_cache', (0, ''))
+    monkeypatch.setattr(printer_api_service_v2, '_timestamp_cache', (0, ''))
+    return '2026-01-02 03:04:05'
+
+
+RECEIPT_NO_CASES = [
+    ('单号: 12345\n时间: 2025-08-14 10:00:00\n', '12345'),
+    ('单号：678\n', '678'),
+    ('单号：　789\n', '789'),
+    ('单号: 12345', '12345'),  # Marker on the last line
+    ('单号', ''),
+    ('单号:', ''),
+    ('单号\n4567', '4567'),  # Number on the next line
+    ('单号:\n  4567  \n', '4567'),
+    ('单号\t\n321', '321'),
+    ('单号\nabc', ''),
+    ('单号\n45a67', ''),
+    ('单号: 55 单号: 66', '55'),  # Two markers on one line
+    ('单号 单号 77', '77'),
+    ('单号单号\n88', '88'),
+    ('单号: 55\n单号: 66', '55'),
+    ('单号: 12 34', '12'),
+    ('单号1234', ''),
+    ('', ''),
+]
+
+
+@pytest.mark.parametrize('plain_text, expected', RECEIPT_NO_CASES)
+def test_should_extract_receipt_no(plain_text, expected):
+    assert printer_api_service.ReceiptExtractor().extract_receipt_no(plain_text) == expected
+
+
+@pytest.mark.parametrize('plain_text, expected', [
+    ('单号: 12345\n时间: 2025-08-14 10:00:00\n', '2025-08-14 10:00:00'),
+    ('时间：2025/08/14 10:00\n', '2025/08/14 10:00'),
+    ('打印时间 2025-08-14 11:11:11', '2025-08-14 11:11:11'),
+    ('时间: 2025-08-14 10:00:00', '2025-08-14 10:00:00'),  # Marker on the last line
+    ('时间', ''),
+    ('时间:', ''),
+    ('时间\n2025-08-14 09:09:09', '2025-08-14 09:09:09'),  # Date on the next line
+    ('时间:\n2025-08-14 09:09:09', '2025-08-14 09:09:09'),
+    ('时间\n08/14/2025 12:00', '08/14/2025 12:00'),
+    ('时间\n今天', ''),  # Next line must look like a date
+    ('时间\n\n2025-01-01', ''),
+    ('时间: \n2025-08-14 09:09:09', ''),  # Empty value after the colon
+    ('时间：\t\n2025-01-01', ''),
+    ('时间:  \n下一行', ''),
+    ('时间: ', ''),
+    ('时间 时间: 2025-01-01 10:00', '2025-01-01 10:00'),  # Two markers on one line
+    ('时间时间\n2025-01-01', '2025-01-01'),
+    ('下单时间: 2025-01-01 结账时间: 2025-01-02', '2025-01-01 结账时间: 2025-01-02'),
+    ('下单时间: 2025-01-01 10:00\n结账时间: 2025-01-02', '2025-01-01 10:00'),
+    ('时间2025-01-01', ''),
+    ('', ''),
+])
+def test_should_extract_timestamp(plain_text, expected):
+    assert printer_api_service.ReceiptExtractor().extract_timestamp(plain_text) == expected
+
+
+@pytest.mark.parametrize('plain_text', ['', '随便写点', '单号: 1\n时间: ', '时间\n今天'])
+def test_should_fall_back_to_now_without_a_timestamp(plain_text, frozen_clock):
+    info = printer_api_service.ReceiptExtractor().extract_receipt_info(plain_text)
+    assert info['timestamp'] == frozen_clock
+
+
+def test_should_only_format_now_timestamp_once_per_second(frozen_clock, monkeypatch):
+    assert printer_api_service.now_timestamp() == frozen_clock
+    monkeypatch.setattr(time, 'strftime', lambda *args: pytest.fail('formatted twice in one second'))
+    assert printer_api_service.now_timestamp() == frozen_clock
+
+
+# v2 takes a colon-less 时间 value from the next line as-is, without the date check
+
+
+@pytest.mark.parametrize('plain_text, expected', RECEIPT_NO_CASES)
+def test_should_extract_receipt_no_in_v2(plain_text, expected):
+    assert printer_api_service_v2.ReceiptExtractor().extract_receipt_no(plain_text) == expected
+
+
+@pytest.mark.parametrize('plain_text, expected', [
+    ('单号: 12345\n时间: 2025-08-14 10:00:00\n', '2025-08-14 10:00:00'),
+    ('时间：2025/08/14 10:00\n', '2025/08/14 10:00'),
+    ('打印时间 2025-08-14 11:11:11', ''),  # Needs a colon on the marker line
+    ('时间: 2025-08-14 10:00:00', '2025-08-14 10:00:00'),  # Marker on the last line
+    ('时间', ''),
+    ('时间:', ''),
+    ('时间\n2025-08-14 09:09:09', '2025-08-14 09:09:09'),  # Date on the next line
+    ('时间:\n2025-08-14 09:09:09', '2025-08-14 09:09:09'),
+    ('时间\n今天', '今天'),
+    ('时间\n\n2025-01-01', ''),
+    ('时间: \n2025-08-14 09:09:09', ''),  # Empty value after the colon
+    ('时间：\t\n2025-01-01', ''),
+    ('时间:  \n下一行', ''),
+    ('时间: ', ''),
+    ('时间 时间: 2025-01-01 10:00', '2025-01-01 10:00'),  # Two markers on one line
+    ('时间时间\n2025-01-01', '2025-01-01'),
+    ('下单时间: 2025-01-01 结账时间: 2025-01-02', '2025-01-01 结账时间: 2025-01-02'),
+    ('下单时间: 2025-01-01 10:00\n结账时间: 2025-01-02', '2025-01-01 10:00'),
+    ('时间2025-01-01', ''),
+    ('', ''),
+])
+def test_should_extract_timestamp_in_v2(plain_text, expected):
+    assert printer_api_service_v2.ReceiptExtractor().extract_timestamp(plain_text) == expected
+
+
+@pytest.mark.parametrize('plain_text', ['', '随便写点', '单号: 1\n时间: ', '时间\n\n2025-01-01'])
+def test_should_fall_back_to_now_without_a_timestamp_in_v2(plain_text, frozen_clock):
+    info = printer_api_service_v2.ReceiptExtractor().extract_receipt_info(plain_text)
+    assert info['timestamp'] == frozen_clock
@@ -0,0 +1,33 @@
+"""API password checks in require_auth"""
+from unittest import mock
+
+import pytest
+
+import printer_api_service_v2
+from printer_api_service_v2 import app, require_auth, service
+
+
+@pytest.fixture
+def view():
+    return require_auth(mock.Mock(return_value='ok'))
+
+
+def test_should_reject_a_wrong_password_and_log_it(view):
+    with mock.patch.object(service, 'logger') as logger, \
+         app.test_request_context('/api/recent', headers={'Authorization': 'wrong-password'}):
+        _, status = view()
+    assert status == 403
+    logger.warning.assert_called_once()
+    view.__wrapped__.assert_not_called()
+
+
+def test_should_require_a_password(view):
+    with app.test_request_context('/api/recent'):
+        _, status = view()
+    assert status == 401
+
+
+def test_should_accept_the_api_password(view):
+    with mock.patch.object(printer_api_service_v2, 'is_valid_password', return_value=True), \
+         app.test_request_context('/api/recent', headers={'Authorization': 'right-password'}):
+        assert view() == 'ok'
@@ -7,5 +7,5 @@ This file is used by gunicorn to start the application
 from printer_api_service_v2 import app
 
 # Export the Flask app for gunicorn
-# Services (TCP server, etc.) are started via gunicorn's when_ready hook
+# Services (TCP server, etc.) are started via gunicorn's post_fork hook
 application = app
\ No newline at end of file